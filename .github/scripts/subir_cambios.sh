@@ -0,0 +1,43 @@
+#!/usr/bin/env bash
+# Sube a main el commit de esta ejecución rebasándolo sobre origin/main.
+# Los workflows de vuelos, trenes y cruceros comparten public/alertas.json y
+# alertas_estado.json: si chocan, se fusionan por feed/alerta (alertas.py) en
+# vez de quedarse con una de las dos versiones. El resto de archivos en
+# conflicto son salidas regeneradas en cada ejecución: gana la de esta.
+set -e
+
+git fetch origin main
+
+if ! git rebase origin/main; then
+  echo "⚠️ Conflicto en el rebase, resolviendo..."
+  TMP=$(mktemp -d)
+  # El rebase se detiene en cada commit local en conflicto
+  while [ -n "$(git diff --name-only --diff-filter=U)" ]; do
+    for f in $(git diff --name-only --diff-filter=U); do
+      case "$f" in
+        public/alertas.json|alertas_estado.json)
+          # Durante un rebase, :2 es origin/main y :3 el commit de esta ejecución
+          git show ":3:$f" > "$TMP/local.json"
+          git show ":2:$f" > "$TMP/remoto.json"
+          rm -f "$f"  # Con marcas de conflicto: no es JSON
+          python scripts/alertas.py --fusionar "$f" "$TMP/local.json" "$TMP/remoto.json"
+          echo "🔀 $f fusionado"
+          ;;
+        *)
+          git checkout --theirs -- "$f"
+          echo "📝 $f: se conserva la versión de esta ejecución"
+          ;;
+      esac
+      git add "$f"
+    done
+    GIT_EDITOR=true git rebase --continue || true
+  done
+  rm -rf "$TMP"
+  if [ -d "$(git rev-parse --git-path rebase-merge)" ]; then
+    echo "❌ El rebase no se ha podido completar. No se sube nada."
+    git rebase --abort || true
+    exit 1
+  fi
+fi
+
+git push origin main
@@ -3,53 +3,129 @@ import os
 import time
 import json
 import re
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+import threading
+from urllib.parse import urljoin
+
+import requests
+from lxml import html as lxml_html
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
 # --- IMPORTS ROBUSTEZ ---
-from utils import safe_save_json, setup_logger, DataValidator
-from config import URLS, OUTPUT_FILES, TIMEOUTS, LIMITS, VALIDATION
+from utils import safe_save_json, setup_logger, load_existing_or_default, DataValidator, ahora_local, procesar_feeds, feeds_fallidos
+from alertas import alertas_trenes
+from trenes_modelo import parsear_horas, crear_tren, fusionar_trenes
+from trenes_demanda import estimar_pax
+from config import URLS, OUTPUT_FILES, TIMEOUTS, LIMITS, VALIDATION, ADIF
+from browser_utils import crear_driver, esperar_crecimiento_filas, esperar_dom_estable, esperar_red_inactiva, USER_AGENT
 
 # --- CONFIGURACIÓN ---
 logger = setup_logger('ADIF_Scraper')
-URL_ADIF = URLS.get('adif', "https://www.adif.es/w/71801-barcelona-sants?pageFromPlid=335")
-OUTPUT_FILE = str(OUTPUT_FILES.get('trenes_sants', os.path.join(os.getcwd(), "public", "trenes_sants.json")))
+ARCHIVO_FUSIONADO = str(OUTPUT_FILES.get('trenes', os.path.join(os.getcwd(), "public", "trenes.json")))
+PRINCIPAL = 'SANTS/llegadas'  # Si este feed falla, el run falla
+
+# Chromes simultáneos: el modo requests va en paralelo sin límite práctico,
+# pero cada fallback a Selenium ocupa un hueco de este semáforo
+NAVEGADORES = threading.BoundedSemaphore(max(1, ADIF.get('max_navegadores', 2)))
+
+# Un único matcher: alguna marca de la whitelist y ninguna de la blacklist
+RE_TREN_VALIDO = re.compile(
+    r"^(?!.*(?:%s)).*?(?:%s)" % (
+        "|".join(map(re.escape, VALIDATION.get('train_blacklist', ["RODALIES", "CERCANIAS"]))),
+        "|".join(map(re.escape, VALIDATION['train_whitelist'])),
+    ),
+    re.S
+)
+def construir_feed(estacion, sentido='llegadas'):
+    """Parámetros, selectores y salida de un tablero (estación + 'llegadas'/'salidas')."""
+    tabla = f"horas-trenes-estacion-{sentido}"
+    return {
+        'codigo': estacion['codigo'],
+        'sentido': sentido,
+        'etiqueta': f"{estacion['codigo']}/{sentido}",
+        'url': estacion['url'],
+        'campo_otro': ADIF['sentidos'][sentido]['campo_otro'],
+        'tab': f"tab-{sentido}",
+        'selector_filas': f"#{tabla} tbody tr",
+        'xpath_filas': f"//*[@id='{tabla}']//tbody/tr",
+        'id_tabla': tabla,
+        'id_cargar_mas': f"tabla-horas-trenes-{sentido}-load-more",
+        'archivo': str(estacion['archivos'][sentido]),
+    }
+
+def feeds_activos():
+    activas = ADIF.get('estaciones_activas', ['SANTS'])
+    return [
+        construir_feed(estacion, sentido)
+        for estacion in URLS.get('adif_estaciones', [])
+        if estacion['codigo'] in activas
+        for sentido in estacion['archivos']
+    ]
 
 def click_js(driver, elemento):
     driver.execute_script("arguments[0].click();", elemento)
 
-def limpiar_hora(texto_hora):
-    """Si hay salto de línea (12:00\n12:10), nos quedamos con la última."""
-    if not texto_hora: return ""
-    partes = texto_hora.split('\n')
-    return partes[-1].strip()
-
 def limpiar_nombre_tren(texto_sucio):
     # Convierte "RF - AVE 03662" en "AVE 03662"
     texto = texto_sucio.replace('\n', ' ')
     limpio = re.sub(r'^(RF|RI|MD|R\d+|IL)\s*-\s*', '', texto)
     return limpio.strip()
 
-def obtener_trenes():
-    print("🚀 Iniciando Scraper de Trenes Sants (Modo GitHub Actions)...")
-    
-    options = Options()
-    options.add_argument('--headless')
-    options.add_argument('--no-sandbox')
-    options.add_argument('--disable-dev-shm-usage')
-    options.add_argument('--window-size=1920,1080')
-    options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
-    
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+def parsear_tabla(html, feed):
+    """
+    HTML (página completa o fragmento de filas) -> lista de celdas por fila.
+    Cada celda conserva los saltos de línea entre sus nodos de texto, como
+    el .text de Selenium ("12:00\n12:10"). Solo se leen las filas de la
+    tabla del feed; un fragmento suelto de <tr> sin ninguna <table> (respuesta
+    de "Cargar más") se toma entero. Una página cuya tabla está vacía no
+    devuelve nada (nunca las filas de otra tabla, p.ej. la de salidas).
+    """
+    if not html or not html.strip():
+        return []
+    arbol = lxml_html.fromstring(html)
+    filas = arbol.xpath(feed['xpath_filas'])
+    if not filas and not arbol.xpath("//table"):
+        filas = arbol.xpath("//tr")
+    return [
+        ["\n".join(t.strip() for t in td.itertext() if t.strip()) for td in fila.xpath("./td")]
+        for fila in filas
+    ]
+
+def filtrar_trenes(filas, ahora=None, campo_otro='origen'):
+    """Celdas crudas -> trenes de larga distancia (whitelist/blacklist de config)."""
+    ahora = ahora or ahora_local()
     datos = []
+    for celdas in filas:
+        if len(celdas) < 3: continue
+
+        # "12:00\n12:10": programada y estimada
+        programada, estimada = parsear_horas(celdas[0])
+        if not programada: continue
+
+        tipo_limpio = limpiar_nombre_tren(celdas[2].upper())
+        if RE_TREN_VALIDO.match(tipo_limpio):
+            datos.append(crear_tren(
+                programada, estimada, celdas[1], tipo_limpio,
+                celdas[3] if len(celdas) > 3 else "-", ahora, campo_otro
+            ))
+    return datos
+
+def obtener_filas_selenium(feed):
+    """Modo navegador: pestaña del sentido + Larga Distancia + "Cargar más" hasta el final."""
+    with NAVEGADORES:
+        return _obtener_filas_selenium(feed)
+
+def _obtener_filas_selenium(feed):
+    print(f"🌐 [{feed['etiqueta']}] Modo Selenium (Chrome)...")
+    
+    # Chrome con blocklist de red (imágenes, fuentes, OneTrust, analítica)
+    driver = crear_driver('adif')
+    filas = []
+    selector_filas = feed['selector_filas']
 
     try:
-        driver.get(URL_ADIF)
+        driver.get(feed['url'])
         wait = WebDriverWait(driver, 20) # Aumentado tiempo de espera inicial
         
         # 1. MATAR COOKIES (Crítico para que no tapen el botón de cargar)
@@ -59,19 +135,23 @@ def obtener_trenes():
         # 2. NAVEGACIÓN
         print("👆 Configurando filtros...")
         # Espera explicita a la pestaña
-        tab_llegadas = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "a[href='#tab-llegadas']")))
-        click_js(driver, tab_llegadas)
-        time.sleep(2)
+        tab = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, f"a[href='#{feed['tab']}']")))
+        click_js(driver, tab)
 
-        # Seleccionar Radio Button (Larga Distancia)
-        radios = driver.find_elements(By.CSS_SELECTOR, "input[type='radio']")
+        # Seleccionar Radio Button (Larga Distancia) dentro de la pestaña
+        consultar = f"#{feed['tab']} input[value='Consultar']"
+        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, consultar)))
+        radios = driver.find_elements(By.CSS_SELECTOR, f"#{feed['tab']} input[type='radio']")
         if len(radios) > 1: click_js(driver, radios[1])
         
         # Botón Consultar
-        btn_consultar = driver.find_element(By.CSS_SELECTOR, "input[value='Consultar']")
+        btn_consultar = driver.find_element(By.CSS_SELECTOR, consultar)
         click_js(driver, btn_consultar)
         print("⏳ Consulta enviada. Esperando tabla...")
-        time.sleep(6) # Damos tiempo a la carga inicial
+        # La tabla puede traer ya filas sin filtrar: esperamos a la respuesta y a que se repinte
+        esperar_red_inactiva(driver)
+        esperar_dom_estable(driver, selector=f"#{feed['id_tabla']}")
+        n_filas = esperar_crecimiento_filas(driver, selector_filas, 0, timeout=TIMEOUTS.get('page_load', 20))
 
         # 3. BUCLE "PAC-MAN" MEJORADO
         print("🔄 Buscando trenes ocultos (Scroll infinito)...")
@@ -81,25 +161,30 @@ def obtener_trenes():
             try:
                 # Scroll al fondo de la página
                 driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                time.sleep(1.5)
 
                 # Buscamos el botón específico
-                botones_carga = driver.find_elements(By.CSS_SELECTOR, "#tabla-horas-trenes-llegadas-load-more input")
+                botones_carga = driver.find_elements(By.CSS_SELECTOR, f"#{feed['id_cargar_mas']} input")
                 
                 if botones_carga:
                     boton = botones_carga[0]
                     # Truco: Scroll específico al elemento para asegurar que es "clickable"
                     driver.execute_script("arguments[0].scrollIntoView(true);", boton)
-                    time.sleep(0.5)
                     
                     if boton.is_displayed():
                         print("   ⬇️ Clic en 'Cargar más'...")
                         click_js(driver, boton)
-                        time.sleep(3.5) # Espera para que carguen filas
-                        intentos_fallidos = 0 # Reiniciar contador
+                        # Espera a que lleguen filas nuevas (no un sleep fijo)
+                        nuevas = esperar_crecimiento_filas(driver, selector_filas, n_filas, timeout=TIMEOUTS.get('element_wait', 10))
+                        if nuevas <= n_filas:
+                            print("   ⚠️ 'Cargar más' no añadió filas.")
+                            intentos_fallidos += 1
+                        else:
+                            intentos_fallidos = 0 # Reiniciar contador
+                        n_filas = nuevas
                     else:
                         print("   ⚠️ Botón detectado pero no visible. Reintentando scroll...")
                         intentos_fallidos += 1
+                        esperar_crecimiento_filas(driver, selector_filas, n_filas, timeout=TIMEOUTS.get('click_wait', 3.0))
                 else:
                     print("   ✅ No hay más botones de carga.")
                     break
@@ -115,70 +200,205 @@ def obtener_trenes():
 
         # 4. EXTRACCIÓN Y LIMPIEZA
         print("👀 Procesando filas extraídas...")
-        filas = driver.find_elements(By.CSS_SELECTOR, "#horas-trenes-estacion-llegadas tbody tr")
-        print(f"📊 Filas encontradas en HTML: {len(filas)}")
-        
-        whitelist = ["AVE", "AVLO", "OUIGO", "IRYO", "ALVIA", "EUROMED", "INTERCITY", "TGV", "LD", "MD", "AVANT"]
-
-        for fila in filas:
-            try:
-                celdas = fila.find_elements(By.TAG_NAME, "td")
-                if len(celdas) < 3: continue
-
-                hora_raw = celdas[0].text.strip()
-                origen = celdas[1].text.strip()
-                tipo_raw = celdas[2].text.strip().upper()
-                via = celdas[3].text.strip() if len(celdas) > 3 else "-"
-                
-                # Limpieza
-                hora_real = limpiar_hora(hora_raw)
-                tipo_limpio = limpiar_nombre_tren(tipo_raw)
-
-                # Validaciones
-                if not re.match(r"\d{2}:\d{2}", hora_real): continue
-                
-                # Filtros
-                es_valido = any(marca in tipo_limpio for marca in whitelist)
-                if "RODALIES" in tipo_raw or "CERCANIAS" in tipo_raw: es_valido = False
-
-                if es_valido:
-                    datos.append({
-                        "hora": hora_real,
-                        "origen": origen,
-                        "tren": tipo_limpio,
-                        "via": via
-                    })
-            except: continue
+        # Un único page_source y parseo local con lxml (sin round-trips por celda)
+        filas = parsear_tabla(driver.page_source, feed)
+        print(f"📊 [{feed['etiqueta']}] Filas encontradas en HTML: {len(filas)}")
 
     except Exception as e:
-        print(f"❌ Error crítico: {e}")
+        print(f"❌ [{feed['etiqueta']}] Error crítico: {e}")
         # Opcional: Imprimir el HTML si falla para debuggear en los logs de GitHub
         # print(driver.page_source[:1000]) 
     finally:
         driver.quit()
 
-    # 5. GUARDADO SEGURO (No sobrescribe si datos son inválidos)
+    return filas
+
+# =============================================================================
+# MODO SIN NAVEGADOR (requests contra el portlet)
+# =============================================================================
+# El tablero de la estación es un portlet: "Consultar" y "Cargar más" envían
+# formularios al propio portlet, que responde con las filas. Se reproducen
+# esos envíos con una sesión HTTP (mismas cookies, mismos campos).
+def datos_formulario(nodo, pulsado=None):
+    """
+    (url, campos) del <form> que contiene `nodo`, como lo enviaría el
+    navegador (url None = la propia página). (None, None) si no hay nada
+    que reenviar.
+    """
+    form = next(iter(nodo.iterancestors('form')), None)
+    if form is None:
+        # Botones AJAX sin <form>: URL en data-url / data-href
+        url = nodo.get('data-url') or nodo.get('data-href')
+        return (url, {}) if url else (None, None)
+
+    campos = {}
+    radios = {}
+    for inp in form.xpath('.//input[@name]'):
+        tipo = (inp.get('type') or 'text').lower()
+        nombre = inp.get('name')
+        if tipo in ('submit', 'button', 'image'):
+            if inp is pulsado:
+                campos[nombre] = inp.get('value', '')
+            continue
+        if tipo == 'radio':
+            radios.setdefault(nombre, []).append(inp.get('value', ''))
+            continue
+        if tipo == 'checkbox' and inp.get('checked') is None:
+            continue
+        campos[nombre] = inp.get('value', '')
+    # Larga Distancia: la segunda opción del grupo (igual que en Selenium)
+    for nombre, valores in radios.items():
+        campos[nombre] = valores[1] if len(valores) > 1 else valores[0]
+    for sel in form.xpath('.//select[@name]'):
+        opcion = (sel.xpath('.//option[@selected]') or sel.xpath('.//option'))[:1]
+        if opcion:
+            campos[sel.get('name')] = opcion[0].get('value', opcion[0].text_content().strip())
+    return form.get('action'), campos
+
+def enviar(session, url, campos):
+    r = session.post(url, data=campos, timeout=TIMEOUTS.get('api_request', 60))
+    r.raise_for_status()
+    return r.text
+
+def obtener_filas_requests(feed):
+    """
+    Página -> Consultar (sentido, Larga Distancia) -> "Cargar más" hasta agotar.
+    None si el tablero no se puede reproducir entero por HTTP (sin formulario
+    de consulta, "Cargar más" sin formulario ni data-url, error de red): una
+    primera página truncada no debe pasar por un tablero completo.
+    """
+    print(f"⚡ [{feed['etiqueta']}] Modo requests (sin navegador)...")
+    url_pagina = feed['url']
+    cargar_mas = f"//*[@id='{feed['id_cargar_mas']}']"
+    session = requests.Session()
+    session.headers.update({'User-Agent': USER_AGENT, 'Accept-Language': 'es-ES,es;q=0.9'})
+    try:
+        r = session.get(url_pagina, timeout=TIMEOUTS.get('api_request', 60))
+        r.raise_for_status()
+        pagina = lxml_html.fromstring(r.text)
+
+        boton = pagina.xpath(f"//*[@id='{feed['tab']}']//input[@value='Consultar']")[:1]
+        if not boton:
+            logger.warning(f"⚠️ [{feed['etiqueta']}] Botón de consulta no encontrado en la página")
+            return None
+        url, campos = datos_formulario(boton[0], pulsado=boton[0])
+        if campos is None:
+            logger.warning(f"⚠️ [{feed['etiqueta']}] Consulta sin formulario reproducible")
+            return None
+        html = enviar(session, urljoin(url_pagina, url or url_pagina), campos)
+        filas = parsear_tabla(html, feed)
+        vistas = set(map(tuple, filas))
+
+        for _ in range(ADIF.get('max_pages', 30)):
+            doc = lxml_html.fromstring(html) if html.strip() else None
+            cargar = doc.xpath(f"{cargar_mas}//input | {cargar_mas}//*[@data-url]") if doc is not None else []
+            if not cargar:
+                break
+            url, campos = datos_formulario(cargar[0], pulsado=cargar[0])
+            if campos is None:
+                logger.warning(f"⚠️ [{feed['etiqueta']}] \"Cargar más\" sin formulario reproducible")
+                return None
+            html = enviar(session, urljoin(url_pagina, url or url_pagina), campos)
+            nuevas = [f for f in parsear_tabla(html, feed) if tuple(f) not in vistas]
+            if not nuevas:
+                break
+            vistas.update(map(tuple, nuevas))
+            filas.extend(nuevas)
+
+        print(f"📊 [{feed['etiqueta']}] Filas recibidas por HTTP: {len(filas)}")
+        return filas
+    except Exception as e:
+        logger.warning(f"⚠️ [{feed['etiqueta']}] Modo requests falló: {e}")
+        return None
+
+# =============================================================================
+# EJECUCIÓN
+# =============================================================================
+def procesar_feed(feed):
+    """Scrapea, fusiona y guarda un tablero. Devuelve sus métricas (ok, trenes, modo, duración)."""
+    etiqueta = feed['etiqueta']
+    inicio = time.time()
+    ahora = ahora_local()
+    minimo = LIMITS.get('min_trains_valid', 5) if etiqueta == PRINCIPAL else 1
+    metricas = {'ok': False, 'modo': None, 'trenes': 0}
+
+    datos = []
+    if ADIF.get('mode', 'requests') == 'requests':
+        metricas['modo'] = 'requests'
+        filas = obtener_filas_requests(feed)
+        if filas is None:
+            logger.warning(f"⚠️ [{etiqueta}] Modo requests no disponible. Fallback a Selenium...")
+        else:
+            datos = filtrar_trenes(filas, ahora, feed['campo_otro'])
+            if len(datos) < minimo:
+                logger.warning(f"⚠️ [{etiqueta}] Modo requests: solo {len(datos)} trenes. Fallback a Selenium...")
+                datos = []
+    if not datos:
+        metricas['modo'] = 'selenium'
+        datos = filtrar_trenes(obtener_filas_selenium(feed), ahora, feed['campo_otro'])
+
+    # GUARDADO SEGURO (No sobrescribe si datos son inválidos)
     if datos:
-        datos.sort(key=lambda x: x['hora'])
+        # Fusión con clave (número + fecha): sin duplicados y conservando lo ya visto
+        previos = load_existing_or_default(feed['archivo'], default=[]) or []
+        datos = fusionar_trenes(previos, datos, ahora)
+        estimar_pax(datos)  # La hora estimada puede haber cambiado de franja
         
         # Usar safe_save_json para validar antes de sobrescribir
         success, message = safe_save_json(
-            filepath=OUTPUT_FILE,
+            filepath=feed['archivo'],
             data=datos,
             data_type='trains',
-            min_items=LIMITS.get('min_trains_valid', 5),
+            min_items=minimo,
             backup=True
         )
         
         if success:
-            logger.info(f"💾 {message}")
+            logger.info(f"💾 [{etiqueta}] {message}")
             logger.info(f"   Último tren: {datos[-1]['hora']} - {datos[-1]['tren']}")
+            metricas.update(ok=True, trenes=len(datos))
+            alertas_trenes(feed['archivo'], datos)
         else:
-            logger.error(message)
-            # Salir con código de error pero SIN sobrescribir datos existentes
-            sys.exit(1)
+            # Sin sobrescribir datos existentes
+            logger.error(f"[{etiqueta}] {message}")
+    else:
+        logger.warning(f"⚠️ [{etiqueta}] No se han extraído datos válidos. Archivo existente NO modificado.")
+
+    metricas['duracion_s'] = round(time.time() - inicio, 1)
+    return metricas
+
+def publicar_fusionado(feeds):
+    """
+    Feed único con todas las estaciones y sentidos, cada tren etiquetado con
+    `estacion` y `sentido`. Se monta desde los archivos por estación, así que
+    un tablero que falla en este run aporta su último estado bueno.
+    """
+    trenes = []
+    for feed in feeds:
+        for t in load_existing_or_default(feed['archivo'], default=[]) or []:
+            trenes.append({**t, 'estacion': feed['codigo'], 'sentido': feed['sentido']})
+    trenes.sort(key=lambda t: (t.get('fecha', ''), t.get('hora_programada', t['hora'])))
+
+    success, message = safe_save_json(
+        filepath=ARCHIVO_FUSIONADO, data=trenes, data_type='trains', min_items=1, backup=False
+    )
+    if success:
+        logger.info(f"💾 [fusionado] {message}")
     else:
-        logger.warning("⚠️ No se han extraído datos válidos. Archivo existente NO modificado.")
+        logger.error(f"[fusionado] {message}")
+
+def obtener_trenes():
+    print("🚀 Iniciando Scraper de Trenes ADIF (Modo GitHub Actions)...")
+
+    # Todos los tableros a la vez: el run dura lo que la estación más lenta
+    feeds = feeds_activos()
+    inicio = time.time()
+    resultados = procesar_feeds(feeds, procesar_feed, len(feeds), 'trenes', logger)
+    logger.info(f"⏱️ {len(feeds)} tableros en {time.time() - inicio:.0f}s")
+
+    publicar_fusionado(feeds)
+
+    if feeds_fallidos(resultados, PRINCIPAL):
         sys.exit(1)
 
 if __name__ == "__main__":
@@ -0,0 +1,153 @@
+"""
+=============================================================================
+AENA HOT - Refresco rápido de llegadas inminentes (T1 / T2 / T2C)
+=============================================================================
+Descripción: Job ligero (cada 5-10 min) que solo lee la primera página o dos
+             de llegadas, actualiza estado/sala de esos vuelos en vuelos.json
+             y publica vuelos_hot.json con la ventana de los próximos minutos.
+             El scraping completo (aena_scrap.py) sigue siendo el camino
+             horario.
+"""
+
+import sys
+from datetime import date
+
+# --- IMPORTS ROBUSTEZ ---
+from utils import safe_save_json, setup_logger, load_existing_or_default, ahora_local, hoy_local
+from config import OUTPUT_FILES, AENA
+from vuelos_eventos import registrar_cambios
+from alertas import alertas_vuelos
+from aena_scrap import (
+    obtener_vuelos_api, obtener_vuelos_xhr, obtener_vuelos_turbo, limpiar_y_deduplicar,
+    minuto_absoluto, construir_feed, ARCHIVO_VUELOS, ARCHIVO_META
+)
+
+# --- LOGGER ---
+logger = setup_logger('AENA_Hot')
+
+ARCHIVO_HOT = str(OUTPUT_FILES.get('vuelos_hot', 'vuelos_hot.json'))
+
+# =============================================================================
+# FETCH (solo las primeras páginas)
+# =============================================================================
+def obtener_vuelos_hot():
+    """Primeras páginas de llegadas por el camino más barato disponible."""
+    max_clicks = AENA.get('hot_max_clicks', 1)
+    api_url = construir_feed('llegadas')['api_url']
+    if AENA.get('extraction_mode', 'dom') == 'xhr':
+        vuelos = obtener_vuelos_api(api_url) if api_url else []
+        if not vuelos:
+            vuelos = obtener_vuelos_xhr(max_clicks=max_clicks)
+        if vuelos:
+            return vuelos
+    return obtener_vuelos_turbo(max_clicks=max_clicks)
+
+# =============================================================================
+# ACTUALIZACIÓN IN-PLACE
+# =============================================================================
+def actualizar_en_sitio(almacenados, frescos, desfase):
+    """
+    Actualiza estado/sala/terminal de los vuelos almacenados que aparecen en
+    el slice fresco. `desfase` = días entre hoy y la fecha base de vuelos.json.
+    Devuelve (vuelos modificados, frescos que no estaban en vuelos.json).
+    """
+    indice = {}
+    for v in almacenados:
+        for codigo in v['vuelo'].split(' / '):
+            indice[(v['dia_relativo'] - desfase, v['hora'], codigo.strip())] = v
+
+    cambios = 0
+    nuevos = []
+    for f in frescos:
+        # Los codeshares frescos vienen agrupados ("A / B"): basta con que uno case
+        v = next((indice[k] for k in (
+            (f['dia_relativo'], f['hora'], codigo.strip()) for codigo in f['vuelo'].split(' / ')
+        ) if k in indice), None)
+        if v is None:
+            nuevos.append(f)
+            continue
+        modificado = False
+        for campo in ('estado', 'sala', 'terminal'):
+            if f.get(campo) and f[campo] != "N/A" and f[campo] != v.get(campo):
+                v[campo] = f[campo]
+                modificado = True
+        cambios += modificado
+    return cambios, nuevos
+
+def construir_slice_hot(vuelos, desfase, ventana_min):
+    """Vuelos entre hace 15 min y dentro de `ventana_min`, con resumen por terminal."""
+    ahora = ahora_local()
+    minuto_ahora = ahora.hour * 60 + ahora.minute
+    en_ventana = []
+    for v in vuelos:
+        try:
+            minuto = minuto_absoluto({**v, 'dia_relativo': v['dia_relativo'] - desfase})
+        except (KeyError, ValueError):
+            continue
+        if minuto_ahora - 15 <= minuto <= minuto_ahora + ventana_min:
+            en_ventana.append(v)
+
+    resumen = {"T1": 0, "T2": 0, "T2C": 0}
+    for v in en_ventana:
+        terminal = v.get('terminal', '')
+        if "T2C" in terminal:
+            resumen["T2C"] += 1
+        elif terminal.startswith("T2"):
+            resumen["T2"] += 1
+        elif terminal.startswith("T1"):
+            resumen["T1"] += 1
+
+    return {
+        "vuelos": en_ventana,
+        "resumen": resumen,
+        "ventana_min": ventana_min,
+        "actualizado": ahora.isoformat(),
+    }
+
+# =============================================================================
+# EJECUCIÓN
+# =============================================================================
+def main():
+    frescos = obtener_vuelos_hot()
+    if not frescos:
+        logger.warning("⚠️ Sin datos frescos. Nada que actualizar.")
+        sys.exit(1)
+    frescos = limpiar_y_deduplicar(frescos)
+
+    almacenados = load_existing_or_default(ARCHIVO_VUELOS, default=[]) or []
+    meta = load_existing_or_default(ARCHIVO_META, default={}) or {}
+    try:
+        desfase = (hoy_local() - date.fromisoformat(meta['fecha'])).days
+    except (KeyError, ValueError):
+        desfase = 0
+
+    previos = [dict(v) for v in almacenados]
+    cambios, nuevos = actualizar_en_sitio(almacenados, frescos, desfase)
+    logger.info(f"🔥 {len(frescos)} vuelos frescos, {cambios} actualizados en vuelos.json")
+
+    if cambios:
+        success, message = safe_save_json(
+            filepath=ARCHIVO_VUELOS, data=almacenados, data_type='flights', backup=False
+        )
+        if success:
+            logger.info(message)
+            # Misma fecha base en ambos snapshots: solo cambios de estado/sala/terminal
+            fecha_base = meta.get('fecha') or hoy_local().isoformat()
+            registrar_cambios(previos, almacenados, fecha_base, construir_feed('llegadas')['archivo_eventos'],
+                              fecha_nueva=date.fromisoformat(fecha_base))
+            alertas_vuelos(ARCHIVO_VUELOS, almacenados, date.fromisoformat(fecha_base))
+        else:
+            logger.error(message)
+
+    # Vuelos que aún no estaban en vuelos.json: entran en el slice (misma base de días)
+    nuevos = [{**f, 'dia_relativo': f['dia_relativo'] + desfase} for f in nuevos]
+    hot = construir_slice_hot(almacenados + nuevos, desfase, AENA.get('hot_window_minutes', 90))
+    success, message = safe_save_json(filepath=ARCHIVO_HOT, data=hot, data_type='generic', backup=False)
+    if success:
+        logger.info(f"💾 {message} | Resumen: {hot['resumen']}")
+    else:
+        logger.error(message)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,9 @@ import os
 import time
 import json
 import re
+from datetime import date, datetime
+
+import requests
 
 # Instalación automática (Solo Colab)
 if 'google.colab' in sys.modules:
@@ -18,274 +21,828 @@ if 'google.colab' in sys.modules:
     else:
         print("✅ Entorno ya estaba listo.")
 
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
 
 # --- IMPORTS ROBUSTEZ ---
-from utils import safe_save_json, setup_logger
-from config import OUTPUT_FILES, LIMITS
+from utils import safe_save_json, setup_logger, load_existing_or_default, ahora_local, hoy_local, procesar_feeds, feeds_fallidos
+from config import OUTPUT_FILES, LIMITS, TIMEOUTS, URLS, AENA, AEROPUERTOS
+from vuelos_eventos import registrar_cambios
+from alertas import alertas_vuelos
+from browser_utils import (
+    crear_driver, esperar_pagina_lista, esperar_dom_estable, esperar_crecimiento_filas,
+    esperar_red_inactiva, contar_elementos, extraer_filas_ancla, capturar_respuestas_red,
+    CAPS_PERFORMANCE_LOG, USER_AGENT
+)
 
 # --- LOGGER ---
 logger = setup_logger('AENA_Scraper')
 
+URL_AENA = URLS.get('aena', "https://www.aena.es/es/infovuelos.html")
+ARCHIVO_VUELOS = str(OUTPUT_FILES.get('vuelos_aena', 'vuelos.json'))
+ARCHIVO_META = str(OUTPUT_FILES.get('vuelos_aena_meta', 'vuelos_meta.json'))
+ARCHIVO_CHECKPOINT = str(OUTPUT_FILES.get('vuelos_aena_checkpoint', 'aena_checkpoint.json'))
+
+def feeds_activos():
+    """Feeds de los aeropuertos y sentidos activos; los códigos desconocidos se ignoran."""
+    feeds = []
+    for codigo in AENA.get('aeropuertos_activos', ['BCN']):
+        if codigo not in AEROPUERTOS:
+            logger.warning(f"⚠️ Aeropuerto desconocido en AENA_AEROPUERTOS: {codigo}")
+            continue
+        for sentido in AENA.get('sentidos_activos', ['llegadas']):
+            if sentido in AENA['sentidos'] and sentido in AEROPUERTOS[codigo]['archivos']:
+                feeds.append(construir_feed(sentido, codigo))
+            else:
+                logger.warning(f"⚠️ Sentido desconocido en AENA_SENTIDOS: {sentido}")
+    return feeds
+
+def construir_feed(sentido='llegadas', codigo='BCN'):
+    """Parámetros y rutas de un feed de infovuelos (aeropuerto + 'llegadas'/'salidas')."""
+    cfg = AENA['sentidos'][sentido]
+    aeropuerto = AEROPUERTOS[codigo]
+    archivo = aeropuerto['archivos'][sentido]
+    return {
+        'sentido': sentido,
+        'codigo': codigo,
+        'aeropuerto': aeropuerto,
+        'etiqueta': f"{codigo}/{sentido}",
+        'placeholder': cfg['placeholder'],
+        'campo_otro': cfg['campo_otro'],
+        'api_url': aeropuerto.get('api_url', {}).get(sentido, ''),
+        'archivo': str(archivo),
+        'archivo_meta': str(archivo.with_name(f"{archivo.stem}_meta.json")),
+        'archivo_eventos': str(archivo.with_name(f"{archivo.stem}_events.json")),
+        'archivo_checkpoint': ARCHIVO_CHECKPOINT.replace('.json', f'_{codigo.lower()}_{sentido}.json'),
+    }
+
+# Celdas de hora "HH:MM" de la tabla de llegadas
+XPATH_HORAS = "//*[contains(text(), ':') and string-length(text()) = 5]"
+
 # =============================================================================
-# 2. FUNCIONES DE PARSEO (V4 - ANCLA)
+# 2. FUNCIONES DE PARSEO (V5 - TOKENIZADOR)
 # =============================================================================
-def parsear_fila_aena_v4(texto_fila, hora_detectada):
-    partes = [p.strip() for p in texto_fila.split(" | ")]
-    obj = {
-        "hora": hora_detectada, "vuelo": "N/A", "aerolinea": "N/A",
-        "origen": "N/A", "terminal": "N/A", "sala": "", "estado": "Programado"
+# Cada celda se clasifica una sola vez con patrones precompilados y la fila
+# se reduce a una cadena de tipos:
+#     "12:00 | VY1234 | Londres | T2 | C | En hora" -> "-vo2oe"
+# Las posiciones de estado, terminal, sala, vuelo y origen solo dependen de
+# esa cadena y hay muy pocas distintas: se calculan una vez por forma de fila.
+# Misma salida que el parser V4 (ver bench_parseo_aena.py).
+BLACKLIST_ESTADO = ("EN HORA", "RETRASADO", "ATERRIZADO", "PROGRAMADO",
+                    "CANCELADO", "DESVIADO", "SALA", "CINTA", "LLEGADA",
+                    "FINALIZADO", "OPERANDO", "EMBARCANDO", "ÚLTIMA LLAMADA")
+TERMINALES = frozenset(("T1", "T2", "TERMINAL T1", "TERMINAL T2"))
+
+RE_ESTADO = re.compile("|".join(map(re.escape, BLACKLIST_ESTADO)))
+RE_CODIGO_VUELO = re.compile(r"[A-Z]{2,3}\d{3,4}")
+RE_HORA_CELDA = re.compile(r"\d{2}:\d{2}")
+RE_TOK_TERMINAL = re.compile("[12]")
+RE_TOK_VUELO = re.compile("[vV]")
+
+# Tipos de celda. Vuelo y texto se separan según puedan ser el origen (la
+# celda tras el código de vuelo): sin hora, terminal ni estado dentro.
+TOK_VUELO, TOK_VUELO_NO_ORIGEN = "v", "V"
+TOK_TEXTO, TOK_TEXTO_NO_ORIGEN = "o", "-"
+TOK_T1, TOK_T2, TOK_ESTADO = "1", "2", "e"
+TOKS_ORIGEN = TOK_VUELO + TOK_TEXTO
+
+# Celda cruda -> tipo. Horas, estados, terminales y orígenes se repiten mucho
+# entre filas (y entre aeropuertos): tras el primer encuentro clasificar una
+# celda es un lookup de dict.
+_TIPOS_CELDA = {}
+_tipo_celda = _TIPOS_CELDA.__getitem__
+MAX_TOKENS_CELDA = 50000
+
+def clasificar_celda(celda_cruda):
+    celda = celda_cruda.strip()
+    celda_upper = celda.upper()
+    es_estado = RE_ESTADO.search(celda_upper) is not None
+    puede_ser_origen = not (es_estado or ":" in celda or "T1" in celda or "T2" in celda)
+    if RE_CODIGO_VUELO.fullmatch(celda):
+        tipo = TOK_VUELO if puede_ser_origen else TOK_VUELO_NO_ORIGEN
+    elif celda_upper in TERMINALES:
+        tipo = TOK_T1 if "T1" in celda_upper else TOK_T2
+    elif es_estado:
+        tipo = TOK_ESTADO
+    else:
+        tipo = TOK_TEXTO if puede_ser_origen else TOK_TEXTO_NO_ORIGEN
+    if len(_TIPOS_CELDA) >= MAX_TOKENS_CELDA:
+        _TIPOS_CELDA.clear()
+    _TIPOS_CELDA[celda_cruda] = tipo
+    return tipo
+
+def tokenizar_fila(texto_fila):
+    """Devuelve (celdas crudas, tipos): `tipos` lleva un carácter TOK_* por celda."""
+    celdas = texto_fila.split(" | ")
+    try:
+        # Caso habitual, todas las celdas ya vistas: el bucle entero corre en C
+        return celdas, "".join(map(_tipo_celda, celdas))
+    except KeyError:
+        return celdas, "".join([_TIPOS_CELDA.get(c) or clasificar_celda(c) for c in celdas])
+
+# Cadena de tipos -> (i_estado, terminal, i_sala, i_vuelo, i_origen)
+_PLANES_FILA = {}
+
+def planificar_fila(tipos):
+    """Posiciones de cada campo para una forma de fila (None si no está)."""
+    n = len(tipos)
+    # Estado: última celda o, si no, la penúltima
+    if tipos[-1] == TOK_ESTADO:
+        i_estado = n - 1
+    elif n > 1 and tipos[-2] == TOK_ESTADO:
+        i_estado = n - 2
+    else:
+        i_estado = None
+
+    # Terminal (primera) y sala (celda siguiente, si es corta: se mira en cada fila)
+    terminal = i_sala = None
+    m = RE_TOK_TERMINAL.search(tipos)
+    if m:
+        terminal = "T" + m.group()
+        if m.start() + 1 < n:
+            i_sala = m.start() + 1
+
+    # Vuelo (primero) y origen (celda siguiente si es texto libre)
+    i_vuelo = i_origen = None
+    m = RE_TOK_VUELO.search(tipos)
+    if m:
+        i_vuelo = m.start()
+        if i_vuelo + 1 < n and tipos[i_vuelo + 1] in TOKS_ORIGEN:
+            i_origen = i_vuelo + 1
+
+    plan = _PLANES_FILA[tipos] = (i_estado, terminal, i_sala, i_vuelo, i_origen)
+    return plan
+
+def terminal_con_sala(terminal, sala, aeropuerto):
+    """Aplica las reglas_sala del aeropuerto (p.ej. BCN: T2 + sala C -> T2C)."""
+    sala_upper = sala.upper()
+    for subcadena, plantilla in aeropuerto['reglas_sala'].get(terminal, ()):
+        if subcadena in sala_upper:
+            return plantilla.format(sala=sala)
+    return terminal
+
+def parsear_fila_aena_v5(texto_fila, hora_detectada, aeropuerto=None):
+    aeropuerto = aeropuerto or AEROPUERTOS['BCN']
+    celdas, tipos = tokenizar_fila(texto_fila)
+    i_estado, terminal, i_sala, i_vuelo, i_origen = _PLANES_FILA.get(tipos) or planificar_fila(tipos)
+
+    sala = ""
+    if terminal is None:
+        terminal = aeropuerto['terminal_defecto'] or "N/A"
+    elif i_sala is not None:
+        posible_sala = celdas[i_sala].strip()
+        if len(posible_sala) < 6:
+            sala = posible_sala
+            terminal = terminal_con_sala(terminal, sala, aeropuerto)
+
+    # Celdas sin limpiar: solo se hace strip de las que acaban en el registro
+    return {
+        "hora": hora_detectada,
+        "vuelo": "N/A" if i_vuelo is None else celdas[i_vuelo].strip(),
+        "aerolinea": "N/A",
+        "origen": "N/A" if i_origen is None else celdas[i_origen].strip(),
+        "terminal": terminal,
+        "sala": sala,
+        "estado": "Programado" if i_estado is None else celdas[i_estado].strip(),
     }
-    BLACKLIST_ESTADO = ["EN HORA", "RETRASADO", "ATERRIZADO", "PROGRAMADO", 
-                        "CANCELADO", "DESVIADO", "SALA", "CINTA", "LLEGADA", 
-                        "FINALIZADO", "OPERANDO", "EMBARCANDO", "ÚLTIMA LLAMADA"]
-    # Estado
-    if len(partes) > 0:
-        ultimo = partes[-1].upper()
-        if any(x in ultimo for x in BLACKLIST_ESTADO):
-            obj["estado"] = partes[-1]
-        elif len(partes) > 1:
-            penultimo = partes[-2].upper()
-            if any(x in penultimo for x in BLACKLIST_ESTADO):
-                obj["estado"] = partes[-2]
-    # Terminal
-    idx_terminal = -1
-    for i, p in enumerate(partes):
-        p_upper = p.upper()
-        if p_upper in ["T1", "T2", "TERMINAL T1", "TERMINAL T2"]:
-            obj["terminal"] = "T1" if "T1" in p_upper else "T2"
-            idx_terminal = i
-            break
-    # Sala
-    if idx_terminal != -1 and len(partes) > idx_terminal + 1:
-        posible_sala = partes[idx_terminal + 1]
-        if len(posible_sala) < 6: 
-            obj["sala"] = posible_sala
-            if obj["terminal"] == "T2" and "C" in posible_sala.upper():
-                obj["terminal"] = "T2C (EasyJet)"
-            elif obj["terminal"] == "T2":
-                obj["terminal"] = f"T2{posible_sala}"
-    # Vuelo y Origen
-    for i, p in enumerate(partes):
-        if re.match(r"^[A-Z]{2,3}\d{3,4}$", p):
-            obj["vuelo"] = p
-            if i + 1 < len(partes):
-                candidato_origen = partes[i+1]
-                es_hora = ":" in candidato_origen
-                es_terminal = "T1" in candidato_origen or "T2" in candidato_origen
-                es_estado = any(x in candidato_origen.upper() for x in BLACKLIST_ESTADO)
-                if not es_hora and not es_terminal and not es_estado:
-                    obj["origen"] = candidato_origen
-            break 
-    return obj
 
 def limpiar_y_deduplicar(datos):
+    """
+    Agrupa los codeshares: un registro por vuelo operado (día, hora, origen)
+    con la lista ordenada de códigos comerciales (`codigos`) y de compañías
+    conocidas (`aerolineas`). `vuelo` se sigue publicando como "A / B / C" y
+    `aerolinea` pasa a "Multicompania" en cuanto el vuelo aparece en más de
+    una fila o con más de un código, como hasta ahora.
+    """
     print(f"\n🧹 Procesando {len(datos)} vuelos crudos...")
-    unicos = {}
+    grupos = {}
     for v in datos:
         origen_clean = v['origen'].strip().upper()
+        # Los registros ya fusionados (p.ej. previos del modo delta) traen "A / B"
+        codigos = v.get('codigos') or [c.strip() for c in v['vuelo'].split(' / ') if c.strip() not in ("", "N/A")]
         clave = (v['dia_relativo'], v['hora'], v['vuelo'] if origen_clean == "N/A" else origen_clean)
-        if clave in unicos:
-            existente = unicos[clave]
-            existente['aerolinea'] = "Multicompania"
-            if v['vuelo'] != "N/A" and v['vuelo'] not in existente['vuelo']:
-                existente['vuelo'] = f"{existente['vuelo']} / {v['vuelo']}"
-            if "T2C" in v['terminal'] and "T2C" not in existente['terminal']:
-                 existente['terminal'] = v['terminal']
+        grupo = grupos.get(clave)
+        if grupo is None:
+            grupo = grupos[clave] = {'registro': dict(v), 'filas': 0, 'codigos': [], 'vistos': set(), 'aerolineas': []}
         else:
-            unicos[clave] = v
-    lista = list(unicos.values())
+            existente = grupo['registro']
+            if "T2C" in v['terminal'] and "T2C" not in existente['terminal']:
+                existente['terminal'] = v['terminal']
+        grupo['filas'] += 1
+        for codigo in codigos:
+            if codigo not in grupo['vistos']:
+                grupo['vistos'].add(codigo)
+                grupo['codigos'].append(codigo)
+        for aerolinea in v.get('aerolineas') or [v.get('aerolinea', "N/A")]:
+            if aerolinea not in ("N/A", "Multicompania") and aerolinea not in grupo['aerolineas']:
+                grupo['aerolineas'].append(aerolinea)
+
+    lista = [renderizar_grupo(g) for g in grupos.values()]
     lista.sort(key=lambda x: (x['dia_relativo'], x['hora']))
     return lista
 
+def renderizar_grupo(grupo):
+    """Grupo de codeshares -> registro con los campos de vuelos.json."""
+    v = grupo['registro']
+    v['vuelo'] = " / ".join(grupo['codigos']) or "N/A"
+    v['codigos'] = grupo['codigos']
+    v['aerolineas'] = grupo['aerolineas']
+    if grupo['filas'] > 1 or len(grupo['codigos']) > 1:
+        v['aerolinea'] = "Multicompania"
+    return v
+
 # =============================================================================
 # 3. MOTOR TURBO (LÓGICA BIDIRECCIONAL + 50 CLICKS)
 # =============================================================================
-def obtener_vuelos_turbo():
-    options = Options()
-    options.add_argument('--headless') 
-    options.add_argument('--no-sandbox')
-    options.add_argument('--disable-dev-shm-usage')
-    options.add_argument('--window-size=1920,1080')
-    options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
-    
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-    url = "https://www.aena.es/es/infovuelos.html"
-    datos_recolectados = []
+def abrir_infovuelos(driver, feed):
+    """Carga infovuelos y lanza la búsqueda de llegadas/salidas de BCN."""
+    print(f"✈️ Entrando en AENA ({feed['etiqueta']})...")
+    driver.get(URL_AENA)
+    esperar_pagina_lista(driver)
 
+    # BÚSQUEDA
+    try: driver.execute_script("var b=document.querySelectorAll('.onetrust-pc-dark-filter, #onetrust-consent-sdk');b.forEach(e=>e.remove());")
+    except: pass
     try:
-        print(f"✈️ Entrando en AENA...")
-        driver.get(url)
-        time.sleep(3)
+        inp = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.XPATH, f"//input[contains(@placeholder, '{feed['placeholder']}')]")))
+        inp.send_keys(feed['aeropuerto']['nombre'])
+        esperar_dom_estable(driver, timeout=3)
+        driver.execute_script("arguments[0].click();", driver.find_element(By.ID, "btnBuscadorVuelos"))
+    except: pass
+
+# --- CHECKPOINT (reanudar tras un crash de Chrome o una página colgada) ---
+def estado_turbo_inicial(firma):
+    """Estado de la pasada DOM: filas extraídas + seguimiento de día."""
+    return {
+        'firma': firma,
+        'datos': [],
+        'filas_leidas': 0,  # Filas con hora ya recorridas (posición en la tabla)
+        'hora_inicio': -1,
+        'dia_actual': 0,
+        'ultimo_minuto_check': -1,
+        'clicks': 0,
+    }
+
+def guardar_checkpoint(estado, ruta):
+    data = {**estado, 'fecha': hoy_local().isoformat(), 'guardado': ahora_local().isoformat()}
+    success, message = safe_save_json(filepath=ruta, data=data, data_type='generic', backup=False)
+    if not success:
+        logger.warning(f"⚠️ Checkpoint no guardado: {message}")
+
+def cargar_checkpoint(firma, ruta):
+    """Checkpoint del mismo día, mismo modo y reciente; si no, estado nuevo."""
+    data = load_existing_or_default(ruta, default=None)
+    try:
+        antiguedad = (ahora_local() - datetime.fromisoformat(data['guardado'])).total_seconds() / 60
+        if (data['firma'] == firma and data['fecha'] == hoy_local().isoformat()
+                and antiguedad <= AENA.get('checkpoint_ttl_minutes', 30)):
+            estado = estado_turbo_inicial(firma)
+            estado.update({k: data[k] for k in ('datos', 'filas_leidas', 'hora_inicio', 'dia_actual', 'ultimo_minuto_check', 'clicks')})
+            logger.info(f"♻️ Reanudando desde checkpoint: {len(estado['datos'])} vuelos, {estado['clicks']} clicks")
+            return estado
+    except (TypeError, KeyError, ValueError):
+        pass
+    return estado_turbo_inicial(firma)
+
+def borrar_checkpoint(ruta):
+    try:
+        os.remove(ruta)
+    except OSError:
+        pass
+
+def pasada_turbo(estado, feed, conocidos, ventana_caliente_min, max_clicks):
+    """
+    Una sesión de Chrome sobre infovuelos. Modifica `estado` según avanza y
+    guarda checkpoint cada N clicks. Devuelve True si termina (parada normal
+    o fin de botones); los fallos de Chrome se propagan para reintentar.
+    """
+    driver = crear_driver('aena')
+    try:
+        abrir_infovuelos(driver, feed)
 
-        # BÚSQUEDA
-        try: driver.execute_script("var b=document.querySelectorAll('.onetrust-pc-dark-filter, #onetrust-consent-sdk');b.forEach(e=>e.remove());")
-        except: pass
-        try:
-            inp = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.XPATH, "//input[contains(@placeholder, 'llegada')]")))
-            inp.send_keys("JOSEP TARRADELLAS BARCELONA-EL PRAT")
-            time.sleep(1)
-            driver.execute_script("arguments[0].click();", driver.find_element(By.ID, "btnBuscadorVuelos"))
-        except: pass
-        
         print("⏳ Esperando tabla...")
-        time.sleep(5)
+        esperar_crecimiento_filas(driver, XPATH_HORAS, 0, timeout=TIMEOUTS.get('page_load', 20), xpath=True)
 
-        # === FASE 1: CARGAR TODO ===
-        hora_inicio = -1
-        dia_actual = 0 
-        ultimo_minuto_check = -1
+        # === CARGA + EXTRACCIÓN INCREMENTAL (una sola pasada lineal) ===
+        # Tras cada click solo se leen las filas nuevas; las ya procesadas se
+        # eliminan del DOM (o se marcan) para que el XPath no recorra todo.
+        # Al reanudar, la tabla se recarga desde arriba en el mismo orden: las
+        # primeras `filas_leidas` filas se saltan por posición, sin parsear ni
+        # tocar el seguimiento de día (su texto puede haber cambiado: estado,
+        # sala...). El cursor ya garantiza que cada fila se lee una sola vez.
         stop_flag = False
         clicks = 0
-        MAX_PAGINAS = 80
-        MIN_CLICKS_OBLIGATORIOS = 70 
+        clicks_previos = estado['clicks']
+        MAX_PAGINAS = max_clicks
+        MIN_CLICKS_OBLIGATORIOS = feed['aeropuerto'].get('min_clicks', 70)
+        CHECKPOINT_CADA = AENA.get('checkpoint_every_clicks', 10)
+        modo_cursor = 'podar' if AENA.get('dom_pruning', True) else 'marcar'
+        datos_recolectados = estado['datos']
+        filas_a_saltar = estado['filas_leidas']
 
-        print(f"\n🚀 FASE 1: Carga Rápida (Requisito: >{MIN_CLICKS_OBLIGATORIOS} clicks y 24h reales)...")
+        if clicks_previos:
+            print(f"\n⏩ Reanudando: {len(datos_recolectados)} vuelos ya extraídos, recargando hasta el click {clicks_previos}...")
+        else:
+            print(f"\n🚀 Carga incremental (Requisito: >{MIN_CLICKS_OBLIGATORIOS} clicks y 24h reales)...")
+
+        while True:
+            for fila in extraer_filas_ancla(driver, XPATH_HORAS, niveles=2, modo=modo_cursor):
+                try:
+                    hora_str = fila['ancla']
+                    if not RE_HORA_CELDA.fullmatch(hora_str): continue
+
+                    if filas_a_saltar:
+                        filas_a_saltar -= 1
+                        continue
+                    estado['filas_leidas'] += 1
+
+                    texto_fila = " | ".join(fila['partes'])
+                    m_actual = int(hora_str.split(':')[0])*60 + int(hora_str.split(':')[1])
 
-        while not stop_flag and clicks < MAX_PAGINAS:
-            try:
-                elementos_hora = driver.find_elements(By.XPATH, "//*[contains(text(), ':') and string-length(text()) = 5]")
-                if elementos_hora:
                     # Capturar hora inicio
-                    if hora_inicio == -1:
-                        h_ini = elementos_hora[0].text
-                        if re.match(r"^\d{2}:\d{2}$", h_ini):
-                            hora_inicio = int(h_ini.split(':')[0])*60 + int(h_ini.split(':')[1])
-                            ultimo_minuto_check = hora_inicio
-                            print(f"⏱️ Hora Inicio: {h_ini}")
-
-                    # Mirar el último visible
-                    h_fin = elementos_hora[-1].text
-                    if re.match(r"^\d{2}:\d{2}$", h_fin):
-                        m_act = int(h_fin.split(':')[0])*60 + int(h_fin.split(':')[1])
-                        
-                        # --- LÓGICA BIDIRECCIONAL (CORRECCIÓN DE ERRORES) ---
-                        diferencia = ultimo_minuto_check - m_act
-                        
-                        # 1. Si bajamos drásticamente (23:00 -> 01:00) -> DÍA SIGUIENTE
-                        if diferencia > 600:
-                            dia_actual += 1
-                            if clicks >= MIN_CLICKS_OBLIGATORIOS:
-                                print(f"🌙 Cambio de día DETECTADO ({h_fin}). Día relativo: {dia_actual}")
-                        
-                        # 2. Si subimos drásticamente (01:00 -> 23:00) -> VOLVIMOS ATRÁS (Corregir error AENA)
-                        elif diferencia < -600:
-                            dia_actual -= 1
-                            print(f"🔙 Corrección de día detectada ({h_fin}). Volvemos al día: {dia_actual}")
-
-                        ultimo_minuto_check = m_act
-
-                        # --- CONDICIÓN DE PARADA ---
-                        # Solo paramos si ya hemos pasado al día siguiente DE VERDAD y tenemos los clicks
-                        if dia_actual >= 1 and m_act >= hora_inicio:
-                            if clicks >= MIN_CLICKS_OBLIGATORIOS:
-                                print(f"🛑 Círculo 24h cerrado ({h_fin}) y clicks cumplidos. Parando.")
-                                stop_flag = True
-                                break
-                            else:
-                                # Si faltan clicks, IGNORAMOS la señal de parada y seguimos
-                                # La "Corrección de día" arreglará el flag si era un error
-                                pass
-            except: pass
+                    if estado['hora_inicio'] == -1:
+                        estado['hora_inicio'] = m_actual
+                        estado['ultimo_minuto_check'] = m_actual
+                        print(f"⏱️ Hora Inicio: {hora_str}")
+
+                    # --- LÓGICA BIDIRECCIONAL (CORRECCIÓN DE ERRORES) ---
+                    diferencia = estado['ultimo_minuto_check'] - m_actual
+
+                    # 1. Si bajamos drásticamente (23:00 -> 01:00) -> DÍA SIGUIENTE
+                    if diferencia > 600:
+                        estado['dia_actual'] += 1
+                        if clicks >= MIN_CLICKS_OBLIGATORIOS:
+                            print(f"🌙 Cambio de día DETECTADO ({hora_str}). Día relativo: {estado['dia_actual']}")
+
+                    # 2. Si subimos drásticamente (01:00 -> 23:00) -> VOLVIMOS ATRÁS (Corregir error AENA)
+                    elif diferencia < -600:
+                        estado['dia_actual'] -= 1
+                        print(f"🔙 Corrección de día detectada ({hora_str}). Volvemos al día: {estado['dia_actual']}")
 
+                    estado['ultimo_minuto_check'] = m_actual
+
+                    obj = parsear_fila_aena_v5(texto_fila, hora_str, feed['aeropuerto'])
+                    # Si el desorden hace que el día sea -1, lo forzamos a 0
+                    obj["dia_relativo"] = max(0, estado['dia_actual'])
+
+                    if obj["vuelo"] != "N/A" or obj["origen"] != "N/A":
+                        datos_recolectados.append(obj)
+
+                    # --- MODO DELTA: solapamiento con lo que ya tenemos ---
+                    # Dentro de la ventana caliente los estados cambian: se refresca siempre
+                    if conocidos is not None and clave_vuelo(obj) in conocidos:
+                        minuto_abs = obj["dia_relativo"] * 1440 + m_actual
+                        if minuto_abs > estado['hora_inicio'] + ventana_caliente_min:
+                            stop_flag = True
+                            continue
+
+                    # --- CONDICIÓN DE PARADA ---
+                    # Solo paramos si ya hemos pasado al día siguiente DE VERDAD y tenemos los clicks.
+                    # Terminamos de procesar el lote ya cargado antes de salir.
+                    if estado['dia_actual'] >= 1 and m_actual >= estado['hora_inicio'] and clicks >= MIN_CLICKS_OBLIGATORIOS:
+                        stop_flag = True
+                except: continue
+
+            if stop_flag:
+                if conocidos is not None:
+                    print(f"🛑 Delta: solapamiento con datos previos tras {clicks} clicks. Parando.")
+                else:
+                    print("🛑 Círculo 24h cerrado y clicks cumplidos. Parando.")
+                return True
+            if clicks >= MAX_PAGINAS:
+                return True
+
+            # Checkpoint periódico (solo cuando hay progreso nuevo que perder)
+            if clicks > clicks_previos and clicks % CHECKPOINT_CADA == 0:
+                estado['clicks'] = clicks
+                guardar_checkpoint(estado, feed['archivo_checkpoint'])
+
+            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
             try:
-                driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
                 btn = WebDriverWait(driver, 1).until(EC.visibility_of_element_located((By.CLASS_NAME, "btn-see-more")))
-                driver.execute_script("arguments[0].click();", btn)
-                clicks += 1
-                if clicks % 5 == 0: 
-                    estado = "✅" if clicks >= MIN_CLICKS_OBLIGATORIOS else f"⏳ ({clicks}/{MIN_CLICKS_OBLIGATORIOS})"
-                    print(f" ⬇️ Click {clicks} {estado}")
-                time.sleep(0.6)
-            except:
+            except TimeoutException:
                 print("✅ Fin de botones.")
+                return True
+            n_horas = contar_elementos(driver, XPATH_HORAS, xpath=True)
+            driver.execute_script("arguments[0].click();", btn)
+            clicks += 1
+            if clicks % 5 == 0: 
+                estado_clicks = "✅" if clicks >= MIN_CLICKS_OBLIGATORIOS else f"⏳ ({clicks}/{MIN_CLICKS_OBLIGATORIOS})"
+                print(f" ⬇️ Click {clicks} {estado_clicks} | {len(datos_recolectados)} vuelos")
+            # Seguimos en cuanto llegan las filas nuevas (no un sleep fijo)
+            esperar_crecimiento_filas(driver, XPATH_HORAS, n_horas, timeout=TIMEOUTS.get('click_wait', 3.0), xpath=True)
+    finally:
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+def obtener_vuelos_turbo(conocidos=None, ventana_caliente_min=0, max_clicks=80, feed=None):
+    """
+    Scraping DOM de infovuelos. Con `conocidos` (modo delta) se para en
+    cuanto una fila ya conocida aparece fuera de la ventana caliente.
+    `max_clicks` limita las páginas de "ver más" (p.ej. 1-2 en el job hot).
+    Si Chrome cae a mitad, se reintenta con un driver nuevo partiendo del
+    último checkpoint (filas ya extraídas + estado de día).
+    """
+    feed = feed or construir_feed()
+    firma = f"{'delta' if conocidos is not None else 'full'}:{max_clicks}"
+    estado = cargar_checkpoint(firma, feed['archivo_checkpoint'])
+    max_intentos = LIMITS.get('max_retries', 3)
+
+    for intento in range(1, max_intentos + 1):
+        try:
+            if pasada_turbo(estado, feed, conocidos, ventana_caliente_min, max_clicks):
+                borrar_checkpoint(feed['archivo_checkpoint'])
                 break
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            guardar_checkpoint(estado, feed['archivo_checkpoint'])
+            if intento < max_intentos:
+                logger.warning(f"⚠️ Intento {intento}/{max_intentos} fallido con {len(estado['datos'])} vuelos. Reanudando...")
+    else:
+        logger.error(f"❌ Reintentos agotados. Se devuelven {len(estado['datos'])} vuelos parciales (checkpoint conservado)")
 
-        # === FASE 2: LECTURA MASIVA (Igual, pero aplicando la misma lógica bidireccional) ===
-        print(f"\n👀 FASE 2: Procesando y ordenando...")
-        
-        elementos_hora = driver.find_elements(By.XPATH, "//*[contains(text(), ':') and string-length(text()) = 5]")
-        
-        dia_parseo = 0
-        min_anterior_parseo = hora_inicio 
-        
-        if min_anterior_parseo == -1 and elementos_hora:
-             h_txt = elementos_hora[0].text
-             if re.match(r"^\d{2}:\d{2}$", h_txt):
-                 min_anterior_parseo = int(h_txt.split(':')[0])*60 + int(h_txt.split(':')[1])
-
-        filas_procesadas_ids = set()
-
-        for i, el in enumerate(elementos_hora):
-            try:
-                hora_str = el.text
-                if not re.match(r"^\d{2}:\d{2}$", hora_str): continue
-                
-                fila_padre = el.find_element(By.XPATH, "./../..")
-                texto_fila = fila_padre.text.replace("\n", " | ")
-                
-                if texto_fila in filas_procesadas_ids: continue
-                
-                m_actual = int(hora_str.split(':')[0])*60 + int(hora_str.split(':')[1])
-                
-                # LÓGICA BIDIRECCIONAL TAMBIÉN AQUÍ PARA ASIGNAR EL DÍA CORRECTO
-                diferencia = min_anterior_parseo - m_actual
-                if diferencia > 600:
-                    dia_parseo += 1 # Pasamos a mañana
-                elif diferencia < -600:
-                    dia_parseo -= 1 # Oops, volvimos a ayer (desorden)
-                
-                min_anterior_parseo = m_actual 
-
-                obj = parsear_fila_aena_v4(texto_fila, hora_str)
-                # Si el desorden hace que dia_parseo sea -1, lo forzamos a 0
-                obj["dia_relativo"] = max(0, dia_parseo) 
-                
-                if obj["vuelo"] != "N/A" or obj["origen"] != "N/A":
-                    datos_recolectados.append(obj)
-                
-                filas_procesadas_ids.add(texto_fila)
-
-            except: continue
+    return estado['datos']
 
+# =============================================================================
+# 4. MODO XHR (JSON de infovuelos en vez del DOM)
+# =============================================================================
+# Claves candidatas del JSON de AENA (la primera no vacía gana). Sin validar
+# contra un payload real: por eso el modo XHR es opt-in (AENA_MODE=xhr)
+CAMPOS_JSON = {
+    'hora': ['horaProgramada', 'horaProgramadaLlegada', 'horaProgramadaSalida', 'hora', 'scheduledTime'],
+    'fecha': ['fechaProgramada', 'fecha', 'fechaVuelo', 'date'],
+    'vuelo': ['numVuelo', 'numeroVuelo', 'vuelo', 'flightNumber', 'codigoVuelo'],
+    'prefijo': ['oaciCompania', 'codigoOaciCompania', 'iataCompania', 'codigoCompania', 'compania'],
+    'aerolinea': ['nombreCompania', 'descCompania', 'aerolinea', 'airline'],
+    'origen': ['nombreOrigen', 'ciudadOrigen', 'descOrigen', 'origen', 'aeropuertoOrigen'],
+    'origen_iata': ['iataOrigen', 'codigoIataOrigen', 'origenIata', 'iataOtro'],
+    'destino': ['nombreDestino', 'ciudadDestino', 'descDestino', 'destino', 'aeropuertoDestino'],
+    'destino_iata': ['iataDestino', 'codigoIataDestino', 'destinoIata', 'iataOtro'],
+    'terminal': ['terminal', 'terminalLlegada', 'terminalSalida'],
+    'sala': ['sala', 'salaLlegada', 'hall'],
+    'estado': ['descEstado', 'estado', 'estadoVuelo', 'status'],
+    'codigos_compartidos': ['codigosCompartidos', 'vuelosCompartidos', 'codeshares'],
+}
+
+RE_HORA_JSON = re.compile(r"(\d{1,2}):(\d{2})")
+RE_FECHA_ISO = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+RE_FECHA_ES = re.compile(r"(\d{2})/(\d{2})/(\d{4})")
+
+def _campo(item, claves):
+    for clave in claves:
+        valor = item.get(clave)
+        if valor not in (None, "", []):
+            return valor
+    return None
+
+def _normalizar_hora(valor):
+    m = RE_HORA_JSON.search(str(valor or ""))
+    return f"{int(m.group(1)):02d}:{m.group(2)}" if m else None
+
+def _normalizar_fecha(valor):
+    texto = str(valor or "")
+    m = RE_FECHA_ISO.search(texto)
+    if m:
+        return date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+    m = RE_FECHA_ES.search(texto)
+    if m:
+        return date(int(m.group(3)), int(m.group(2)), int(m.group(1)))
+    return None
+
+def normalizar_terminal(terminal, sala, aeropuerto):
+    """Mismas reglas_sala que parsear_fila_aena_v5 (BCN: T2 + sala C -> T2C)."""
+    t = str(terminal or "").upper()
+    if "1" in t:
+        base = "T1"
+    elif "2" in t:
+        base = "T2"
+    else:
+        return aeropuerto['terminal_defecto'] or "N/A"
+    if sala:
+        return terminal_con_sala(base, sala, aeropuerto)
+    return base
+
+def extraer_lista_vuelos(payload):
+    """Localiza la lista de vuelos dentro del JSON (lista raíz o anidada)."""
+    if isinstance(payload, list):
+        if payload and isinstance(payload[0], dict) and _campo(payload[0], CAMPOS_JSON['vuelo'] + CAMPOS_JSON['hora']):
+            return payload
+        for elem in payload:
+            encontrada = extraer_lista_vuelos(elem)
+            if encontrada:
+                return encontrada
+    elif isinstance(payload, dict):
+        for valor in payload.values():
+            encontrada = extraer_lista_vuelos(valor)
+            if encontrada:
+                return encontrada
+    return []
+
+def mapear_vuelo_json(item, hoy, feed):
+    """
+    Convierte un vuelo del JSON al esquema de vuelos.json. Devuelve una
+    lista: un registro por número de vuelo (codeshares incluidos), que
+    limpiar_y_deduplicar agrupa igual que en el modo DOM. En salidas el
+    campo interno 'origen' guarda el destino (ver a_esquema_feed).
+    """
+    hora = _normalizar_hora(_campo(item, CAMPOS_JSON['hora']))
+    if not hora:
+        return []
+
+    fecha = _normalizar_fecha(_campo(item, CAMPOS_JSON['fecha']) or _campo(item, CAMPOS_JSON['hora']))
+    dia_relativo = max(0, (fecha - hoy).days) if fecha else None
+
+    numero = str(_campo(item, CAMPOS_JSON['vuelo']) or "").replace(" ", "").upper()
+    prefijo = str(_campo(item, CAMPOS_JSON['prefijo']) or "").strip().upper()
+    if numero.isdigit() and prefijo:
+        numero = f"{prefijo}{numero}"
+
+    otro = feed['campo_otro']
+    origen = str(_campo(item, CAMPOS_JSON[otro]) or "").strip().upper()
+    iata = str(_campo(item, CAMPOS_JSON[f'{otro}_iata']) or "").strip().upper()
+    if origen and iata and f"({iata})" not in origen:
+        origen = f"{origen} ({iata})"
+
+    sala = str(_campo(item, CAMPOS_JSON['sala']) or "").strip()
+    base = {
+        "hora": hora,
+        "vuelo": numero or "N/A",
+        "aerolinea": str(_campo(item, CAMPOS_JSON['aerolinea']) or "N/A").strip(),
+        "origen": origen or iata or "N/A",
+        "terminal": normalizar_terminal(_campo(item, CAMPOS_JSON['terminal']), sala, feed['aeropuerto']),
+        "sala": sala,
+        "estado": str(_campo(item, CAMPOS_JSON['estado']) or "Programado").strip(),
+        "dia_relativo": dia_relativo,
+    }
+
+    registros = [base]
+    for compartido in _campo(item, CAMPOS_JSON['codigos_compartidos']) or []:
+        codigo = compartido if isinstance(compartido, str) else _campo(compartido, CAMPOS_JSON['vuelo'])
+        if codigo:
+            registros.append({**base, "vuelo": str(codigo).replace(" ", "").upper()})
+    return registros
+
+def asignar_dias_sin_fecha(vuelos):
+    """Para vuelos sin fecha en el JSON, aplica la lógica bidireccional por orden."""
+    dia, minuto_anterior = 0, None
+    for v in vuelos:
+        h, m = v['hora'].split(':')
+        minuto = int(h) * 60 + int(m)
+        if minuto_anterior is not None:
+            diferencia = minuto_anterior - minuto
+            if diferencia > 600:
+                dia += 1
+            elif diferencia < -600:
+                dia -= 1
+        minuto_anterior = minuto
+        if v['dia_relativo'] is None:
+            v['dia_relativo'] = max(0, dia)
+    return vuelos
+
+def parsear_respuestas_json(cuerpos, hoy=None, feed=None):
+    """Cuerpos JSON (texto) -> lista de vuelos en el esquema de vuelos.json."""
+    hoy = hoy or hoy_local()
+    feed = feed or construir_feed()
+    vuelos, vistos = [], set()
+    for cuerpo in cuerpos:
+        try:
+            payload = json.loads(cuerpo) if isinstance(cuerpo, str) else cuerpo
+        except ValueError:
+            continue
+        for item in extraer_lista_vuelos(payload):
+            for v in mapear_vuelo_json(item, hoy, feed):
+                clave = (v['dia_relativo'], v['hora'], v['vuelo'], v['origen'])
+                if clave in vistos:
+                    continue
+                vistos.add(clave)
+                vuelos.append(v)
+    return asignar_dias_sin_fecha(vuelos)
+
+def obtener_vuelos_api(url, feed=None):
+    """Llamada directa al endpoint JSON (sin navegador)."""
+    try:
+        r = requests.get(url, headers={'User-Agent': USER_AGENT, 'Accept': 'application/json'},
+                         timeout=TIMEOUTS.get('api_request', 60))
+        r.raise_for_status()
+        return parsear_respuestas_json([r.text], feed=feed)
     except Exception as e:
-        print(f"❌ Error: {e}")
+        logger.warning(f"⚠️ Endpoint AENA directo falló: {e}")
+        return []
+
+def obtener_vuelos_xhr(max_clicks=80, feed=None):
+    """
+    Carga infovuelos con el performance log activo y parsea las respuestas
+    JSON de la búsqueda. Pulsa "ver más" solo mientras cada click traiga
+    vuelos nuevos por XHR.
+    """
+    feed = feed or construir_feed()
+    driver = crear_driver('aena', capabilities=CAPS_PERFORMANCE_LOG)
+    filtro = AENA.get('xhr_url_filter', 'infovuelos')
+    cuerpos, urls = [], set()
+
+    try:
+        abrir_infovuelos(driver, feed)
+        esperar_red_inactiva(driver, timeout=TIMEOUTS.get('page_load', 20))
+
+        for respuesta in capturar_respuestas_red(driver, filtro):
+            cuerpos.append(respuesta['body'])
+            urls.add(respuesta['url'])
+        vistos = len(parsear_respuestas_json(cuerpos, feed=feed))
+        print(f"📡 {len(cuerpos)} respuestas JSON, {vistos} vuelos")
+
+        for _ in range(max_clicks):
+            try:
+                btn = WebDriverWait(driver, 1).until(EC.visibility_of_element_located((By.CLASS_NAME, "btn-see-more")))
+            except Exception:
+                break
+            driver.execute_script("arguments[0].click();", btn)
+            esperar_red_inactiva(driver, timeout=TIMEOUTS.get('click_wait', 3.0))
+            nuevas = capturar_respuestas_red(driver, filtro)
+            if not nuevas:
+                # La paginación es en cliente: ya tenemos todo
+                break
+            for respuesta in nuevas:
+                cuerpos.append(respuesta['body'])
+                urls.add(respuesta['url'])
+            total = len(parsear_respuestas_json(cuerpos, feed=feed))
+            if total <= vistos:
+                break
+            vistos = total
+    except Exception as e:
+        print(f"❌ Error XHR: {e}")
     finally:
         driver.quit()
-        return datos_recolectados
+
+    for u in sorted(urls):
+        logger.info(f"🔗 Endpoint infovuelos detectado: {u}")
+    return parsear_respuestas_json(cuerpos, feed=feed)
 
 # =============================================================================
-# 4. EJECUCIÓN
+# 5. MODO DELTA (refresco incremental sobre el vuelos.json anterior)
 # =============================================================================
-if __name__ == "__main__":
-    vuelos_raw = obtener_vuelos_turbo()
-    
-    if vuelos_raw:
-        vuelos_clean = limpiar_y_deduplicar(vuelos_raw)
-        
+def clave_vuelo(v):
+    return (v['dia_relativo'], v['hora'], v['vuelo'])
+
+def minuto_absoluto(v):
+    h, m = v['hora'].split(':')
+    return v['dia_relativo'] * 1440 + int(h) * 60 + int(m)
+
+def a_esquema_feed(vuelos, feed):
+    """Internamente el otro aeropuerto va en 'origen'; en salidas se publica como 'destino'."""
+    campo = feed['campo_otro']
+    if campo == 'origen':
+        return vuelos
+    return [{(campo if k == 'origen' else k): val for k, val in v.items()} for v in vuelos]
+
+def desde_esquema_feed(vuelos, feed):
+    campo = feed['campo_otro']
+    if campo == 'origen':
+        return vuelos
+    return [{('origen' if k == campo else k): val for k, val in v.items()} for v in vuelos]
+
+def cargar_estado_previo(feed):
+    """
+    Carga el JSON anterior del feed y reajusta dia_relativo a la fecha de hoy.
+    Devuelve (vuelos_previos, meta) o (None, meta) si no sirve para delta.
+    """
+    meta = load_existing_or_default(feed['archivo_meta'], default={}) or {}
+    previos = load_existing_or_default(feed['archivo'], default=None)
+    if not previos or 'fecha' not in meta:
+        return None, meta
+
+    try:
+        desfase = (hoy_local() - date.fromisoformat(meta['fecha'])).days
+        ultimo_completo = datetime.fromisoformat(meta['ultimo_completo'])
+    except (KeyError, ValueError):
+        return None, meta
+
+    # Cada N horas se hace una pasada completa para rellenar el horizonte de 24h
+    horas_desde_completo = (ahora_local() - ultimo_completo).total_seconds() / 3600
+    if horas_desde_completo >= AENA.get('delta_full_every_hours', 6):
+        return None, meta
+
+    ajustados = []
+    for v in desde_esquema_feed(previos, feed):
+        dia = v.get('dia_relativo', 0) - desfase
+        if dia >= 0:
+            ajustados.append({**v, 'dia_relativo': dia})
+    return ajustados, meta
+
+def indexar_conocidos(vuelos):
+    """(dia_relativo, hora, vuelo) por cada número de vuelo (incluye codeshares)."""
+    conocidos = set()
+    for v in vuelos:
+        for codigo in v['vuelo'].split(' / '):
+            conocidos.add((v['dia_relativo'], v['hora'], codigo.strip()))
+    return conocidos
+
+def fusionar_delta(previos, frescos):
+    """
+    Sustituye el tramo [primer, último] fresco por los datos nuevos y conserva
+    de los previos solo la cola posterior a lo scrapeado.
+    """
+    if not frescos:
+        return previos
+    inicio = min(minuto_absoluto(v) for v in frescos)
+    fin = max(minuto_absoluto(v) for v in frescos)
+    cola = [v for v in previos if minuto_absoluto(v) > fin]
+    print(f"🔀 Delta: {len(frescos)} frescos + {len(cola)} previos (descartados {len(previos) - len(cola)})")
+    # Los previos anteriores a `inicio` ya han pasado: se descartan
+    return frescos + [v for v in cola if minuto_absoluto(v) >= inicio]
+
+def obtener_vuelos(feed=None):
+    """
+    Elige el modo de extracción: API directa -> XHR -> DOM (fallback).
+    Devuelve (vuelos, modo): 'xhr' / 'completo' / 'delta'.
+    """
+    feed = feed or construir_feed()
+    etiqueta = feed['etiqueta']
+    if AENA.get('extraction_mode', 'dom') == 'xhr':
+        vuelos = obtener_vuelos_api(feed['api_url'], feed) if feed['api_url'] else []
+        if not vuelos:
+            vuelos = obtener_vuelos_xhr(feed=feed)
+        if vuelos:
+            logger.info(f"📡 Modo XHR ({etiqueta}): {len(vuelos)} vuelos")
+            return vuelos, 'xhr'
+        logger.warning(f"⚠️ Modo XHR sin datos ({etiqueta}). Fallback a scraping DOM...")
+
+    if AENA.get('refresh_mode') == 'delta':
+        previos, _ = cargar_estado_previo(feed)
+        if previos:
+            ventana = int(AENA.get('delta_hot_hours', 3) * 60)
+            logger.info(f"♻️ Modo delta ({etiqueta}): {len(previos)} vuelos previos, ventana caliente {ventana} min")
+            frescos = obtener_vuelos_turbo(conocidos=indexar_conocidos(previos), ventana_caliente_min=ventana, feed=feed)
+            if frescos:
+                return fusionar_delta(previos, frescos), 'delta'
+        logger.info(f"ℹ️ Sin estado previo válido para delta ({etiqueta}): pasada completa")
+
+    return obtener_vuelos_turbo(feed=feed), 'completo'
+
+def guardar_meta(meta_previa, feed, metricas):
+    """Fecha de referencia de dia_relativo, última pasada completa y métricas del run."""
+    ahora = ahora_local()
+    completo = metricas['modo'] != 'delta'
+    meta = {
+        'fecha': hoy_local().isoformat(),
+        'actualizado': ahora.isoformat(),
+        'ultimo_completo': ahora.isoformat() if completo else meta_previa.get('ultimo_completo', ahora.isoformat()),
+        'metricas': metricas,
+    }
+    safe_save_json(filepath=feed['archivo_meta'], data=meta, data_type='generic', backup=False)
+
+# =============================================================================
+# 6. EJECUCIÓN
+# =============================================================================
+def procesar_feed(feed):
+    """Scrapea, limpia y guarda un feed. Devuelve sus métricas (ok, vuelos, duración...)."""
+    etiqueta = feed['etiqueta']
+    inicio = time.time()
+    meta_previa = load_existing_or_default(feed['archivo_meta'], default={}) or {}
+    vuelos_previos = load_existing_or_default(feed['archivo'], default=[]) or []
+    vuelos_raw, modo = obtener_vuelos(feed)
+    metricas = {'ok': False, 'modo': modo, 'vuelos_crudos': len(vuelos_raw), 'vuelos': 0}
+
+    if not vuelos_raw:
+        logger.warning(f"⚠️ No se encontraron datos ({etiqueta}). Archivo existente NO modificado.")
+    else:
+        vuelos_clean = a_esquema_feed(limpiar_y_deduplicar(vuelos_raw), feed)
+
         # Usar safe_save_json para validar antes de sobrescribir
-        archivo = str(OUTPUT_FILES.get('vuelos_aena', 'vuelos.json'))
-        
         success, message = safe_save_json(
-            filepath=archivo,
+            filepath=feed['archivo'],
             data=vuelos_clean,
             data_type='flights',
-            min_items=LIMITS.get('min_flights_valid', 10),
+            min_items=LIMITS.get('min_flights_valid', 10) if feed['codigo'] == 'BCN' else 1,
             backup=True
         )
-        
         if success:
-            logger.info(f"💾 {message}")
+            logger.info(f"💾 [{etiqueta}] {message}")
+            metricas.update(ok=True, vuelos=len(vuelos_clean))
+            eventos = registrar_cambios(vuelos_previos, vuelos_clean, meta_previa.get('fecha'), feed['archivo_eventos'])
+            metricas['eventos'] = len(eventos)
+            alertas_vuelos(feed['archivo'], vuelos_clean)
         else:
-            logger.error(message)
-            logger.error("❌ Scraping fallido. Archivo existente NO modificado.")
-            sys.exit(1)
-    else:
-        logger.warning("⚠️ No se encontraron datos. Archivo existente NO modificado.")
+            logger.error(f"[{etiqueta}] {message}")
+            logger.error(f"❌ Scraping fallido ({etiqueta}). Archivo existente NO modificado.")
+
+    metricas['duracion_s'] = round(time.time() - inicio, 1)
+    if metricas['ok']:
+        guardar_meta(meta_previa, feed, metricas)
+    return metricas
+
+if __name__ == "__main__":
+    # Un feed por aeropuerto y sentido; cada uno en su propio Chrome (perfil
+    # aislado), con como mucho `max_navegadores` Chromes a la vez
+    feeds = feeds_activos()
+    workers = max(1, min(len(feeds), AENA.get('max_navegadores', 4)))
+    inicio = time.time()
+    resultados = procesar_feeds(feeds, procesar_feed, workers, 'vuelos', logger)
+    logger.info(f"⏱️ {len(feeds)} feeds con {workers} navegadores en {time.time() - inicio:.0f}s")
+
+    # Las llegadas de BCN son el feed principal: si fallan, el run falla
+    if feeds_fallidos(resultados, 'BCN/llegadas'):
         sys.exit(1)
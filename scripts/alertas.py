@@ -0,0 +1,315 @@
+"""
+=============================================================================
+ALERTAS - Motor de reglas sobre los feeds publicados
+=============================================================================
+Descripción: Compila una vez las reglas de config.ALERTS y las evalúa cada
+             vez que un scraper publica un feed (vuelos, trenes, cruceros).
+             Cada feed se resume en un histograma por cubos de N minutos y
+             los totales de cada regla se actualizan solo con los cubos que
+             cambian (contenido nuevo o ventana desplazada). Las alertas
+             disparadas se publican en public/alertas.json; el estado del
+             motor se guarda aparte (alertas_estado.json, no público).
+             Las horas de los feeds son locales (Europe/Madrid).
+"""
+
+import json
+import math
+import os
+import sys
+import threading
+from datetime import date, datetime, timedelta
+
+from utils import safe_save_json, setup_logger, load_existing_or_default, ahora_local, hoy_local
+from config import OUTPUT_FILES, ALERTS
+from trenes_modelo import instante_tren
+
+# --- LOGGER ---
+logger = setup_logger('Alertas')
+
+ARCHIVO_ALERTAS = str(OUTPUT_FILES.get('alertas', 'alertas.json'))
+ARCHIVO_ESTADO = str(OUTPUT_FILES.get('alertas_estado', 'alertas_estado.json'))
+EPOCA = datetime(2000, 1, 1)
+# Los scrapers publican feeds desde varios hilos: leer-evaluar-guardar en serie
+CANDADO = threading.Lock()
+
+# =============================================================================
+# COMPILACIÓN DE REGLAS
+# =============================================================================
+def compilar_regla(regla, minutos_cubo):
+    """Regla de config -> dict con su función de valor por item y nº de cubos."""
+    filtro = tuple((campo, str(texto).upper()) for campo, texto in regla.get('filtro', {}).items())
+    agregado = regla.get('agregado', 'count')
+
+    def valor(item):
+        for campo, texto in filtro:
+            if texto not in str(item.get(campo, '')).upper():
+                return 0
+        if agregado == 'count':
+            return 1
+        return item.get(agregado) or 0
+
+    return {**regla, 'valor': valor, 'cubos': max(1, math.ceil(regla['ventana_min'] / minutos_cubo))}
+
+# =============================================================================
+# INSTANTES POR FEED (item -> datetime programado)
+# =============================================================================
+def _combinar(fecha, hora):
+    try:
+        h, m = str(hora).split(':')[:2]
+        return datetime(fecha.year, fecha.month, fecha.day, int(h), int(m))
+    except (TypeError, ValueError):
+        return None
+
+def instantes_vuelos(vuelos, fecha_base):
+    for v in vuelos:
+        instante = _combinar(fecha_base + timedelta(days=v.get('dia_relativo', 0)), v.get('hora'))
+        if instante:
+            yield instante, v
+
+def instantes_trenes(trenes, ahora):
+    """Fecha de servicio si viene; si no, la hora sola (pasada hace más de 12h = mañana)."""
+    for t in trenes:
+        if 'fecha' in t and 'hora_programada' in t:
+            yield instante_tren(t), t
+            continue
+        instante = _combinar(ahora.date(), t.get('hora'))
+        if instante:
+            if instante < ahora - timedelta(hours=12):
+                instante += timedelta(days=1)
+            yield instante, t
+
+def instantes_cruceros(data):
+    """Solo llegadas: el desembarco es lo que genera demanda."""
+    for c in data.get('llegadas', []):
+        try:
+            fecha = date.fromisoformat(c.get('fecha', ''))
+        except ValueError:
+            continue
+        instante = _combinar(fecha, c.get('hora'))
+        if instante:
+            yield instante, c
+
+# =============================================================================
+# MOTOR
+# =============================================================================
+def firma_reglas(reglas):
+    """
+    Lo que da forma al estado: si cambia, el estado guardado no sirve.
+    Cadena JSON para que sobreviva intacta al ida y vuelta por alertas_estado.json.
+    """
+    return json.dumps([[r['id'], r['feed'], r['cubos'], r.get('filtro', {}), r.get('agregado', 'count')]
+                       for r in reglas], sort_keys=True, ensure_ascii=False)
+
+class MotorAlertas:
+    """
+    Reglas compiladas una vez por proceso. Estado por feed:
+    {'desde': cubo de `ahora`, 'cubos': {cubo: [valor por regla]},
+    'totales': [total por regla], 'activas': [bool por regla],
+    'evaluado': hora local de la última evaluación que lo cambió}.
+    Cada fila de 'cubos' ya está recortada a la ventana de cada regla, así
+    que el total de una regla cambia exactamente en la diferencia entre la
+    fila nueva y la guardada: solo se tocan los cubos cuya fila cambia (los
+    que el feed modifica y los que entran o salen al avanzar el reloj).
+    """
+
+    def __init__(self, archivo_alertas=ARCHIVO_ALERTAS, archivo_estado=ARCHIVO_ESTADO, reglas=None):
+        self.archivo_alertas = archivo_alertas
+        self.archivo_estado = archivo_estado
+        self.minutos_cubo = ALERTS.get('bucket_minutes', 5)
+        self.ancho_cubo = timedelta(minutes=self.minutos_cubo)
+        self.por_feed = {}
+        for regla in (reglas or ALERTS.get('reglas', [])):
+            self.por_feed.setdefault(regla['feed'], []).append(compilar_regla(regla, self.minutos_cubo))
+        self.firma = {feed: firma_reglas(rs) for feed, rs in self.por_feed.items()}
+        # Alertas y estado se leen en la primera evaluación (no al importar)
+        self.alertas = None
+        self.estado = None
+        self.alertas_modificadas = False
+        self.estado_modificado = False
+
+    def _cargar(self):
+        if self.estado is not None:
+            return
+        self.alertas = (load_existing_or_default(self.archivo_alertas, default={}) or {}).get('alertas', [])
+        guardado = (load_existing_or_default(self.archivo_estado, default={}) or {}).get('feeds', {})
+        self.estado = {}
+        for feed, e in guardado.items():
+            if e.get('firma') != self.firma.get(feed):
+                continue  # Reglas cambiadas en config: se empieza de cero
+            self.estado[feed] = {**e, 'cubos': {int(c): fila for c, fila in e['cubos'].items()}}
+
+    def _cubo(self, instante):
+        # Aritmética naive (sin timestamp(), que consulta la zona horaria)
+        return (instante - EPOCA) // self.ancho_cubo
+
+    def _histograma(self, reglas, instantes, desde):
+        """{cubo: [valor por regla]} con cada regla limitada a su ventana."""
+        n = len(reglas)
+        limites = [desde + r['cubos'] for r in reglas]
+        horizonte = max(limites)
+        cubos = {}
+        for instante, item in instantes:
+            cubo = self._cubo(instante)
+            if not desde <= cubo < horizonte:
+                continue
+            for i, regla in enumerate(reglas):
+                if cubo < limites[i]:
+                    v = regla['valor'](item)
+                    if v:
+                        fila = cubos.get(cubo)
+                        if fila is None:
+                            fila = cubos[cubo] = [0] * n
+                        fila[i] += v
+        return cubos
+
+    def evaluar(self, feed, instantes, ahora=None):
+        """Evalúa las reglas de `feed`. Devuelve la lista de alertas nuevas."""
+        reglas = self.por_feed.get(feed)
+        if not reglas:
+            return []
+        self._cargar()
+        ahora = ahora or ahora_local()
+        desde = self._cubo(ahora)
+        n = len(reglas)
+        nuevos = self._histograma(reglas, instantes, desde)
+
+        previo = self.estado.get(feed) or {'cubos': {}, 'totales': [0] * n, 'activas': [False] * n}
+        viejos = previo['cubos']
+        totales = list(previo['totales'])
+        cero = [0] * n
+        cambiados = [c for c in nuevos.keys() | viejos.keys() if nuevos.get(c) != viejos.get(c)]
+        for cubo in cambiados:
+            for i, (a, b) in enumerate(zip(nuevos.get(cubo, cero), viejos.get(cubo, cero))):
+                totales[i] += a - b
+
+        disparadas = []
+        activas = list(previo['activas'])
+        for i, regla in enumerate(reglas):
+            if totales[i] == previo['totales'][i]:
+                continue  # Ningún cubo de su ventana ha cambiado
+            activas[i] = totales[i] >= regla['umbral']
+            if activas[i] and not previo['activas'][i]:
+                disparadas.append(self._alerta(regla, totales[i], ahora))
+
+        if cambiados or feed not in self.estado:
+            self.estado[feed] = {'firma': self.firma[feed], 'desde': desde, 'cubos': nuevos,
+                                 'totales': totales, 'activas': activas,
+                                 'evaluado': ahora.isoformat(timespec='seconds')}
+            self.estado_modificado = True
+
+        if disparadas:
+            self.alertas = (self.alertas + disparadas)[-ALERTS.get('max_alertas', 50):]
+            self.alertas_modificadas = True
+            for a in disparadas:
+                logger.info(f"🔔 {a['title']}: {a['message']}")
+        return disparadas
+
+    def _alerta(self, regla, valor, ahora):
+        # Mismo esquema que la interfaz Alert de AlertsView
+        return {
+            'id': f"{regla['id']}-{ahora.strftime('%Y%m%d%H%M')}",
+            'type': regla.get('tipo', 'flights'),
+            'title': regla['titulo'],
+            'message': regla['mensaje'].format(valor=valor, ventana_min=regla['ventana_min']),
+            'time': ahora.isoformat(timespec='seconds'),
+            'priority': regla.get('prioridad', 'medium'),
+            'regla': regla['id'],
+            'valor': valor,
+        }
+
+    def guardar(self):
+        actualizado = ahora_local().isoformat(timespec='seconds')
+        if self.alertas_modificadas:
+            success, message = safe_save_json(
+                filepath=self.archivo_alertas,
+                data={'actualizado': actualizado, 'alertas': self.alertas},
+                data_type='generic',
+                backup=False
+            )
+            if not success:
+                logger.error(message)
+            self.alertas_modificadas = False
+        if self.estado_modificado:
+            feeds = {feed: {**e, 'cubos': {str(c): fila for c, fila in e['cubos'].items()}}
+                     for feed, e in self.estado.items()}
+            success, message = safe_save_json(
+                filepath=self.archivo_estado,
+                data={'actualizado': actualizado, 'feeds': feeds},
+                data_type='generic',
+                backup=False
+            )
+            if not success:
+                logger.error(message)
+            self.estado_modificado = False
+
+# Un motor por proceso: los scrapers publican varios feeds (y desde varios hilos)
+MOTOR = MotorAlertas()
+
+# =============================================================================
+# API PARA LOS SCRAPERS
+# =============================================================================
+def evaluar_publicacion(archivo, instantes):
+    """
+    Punto de entrada tras publicar un feed: el nombre del feed es el del
+    archivo sin extensión. Un fallo aquí nunca debe tumbar al scraper.
+    """
+    try:
+        with CANDADO:
+            MOTOR.evaluar(os.path.splitext(os.path.basename(str(archivo)))[0], instantes)
+            MOTOR.guardar()
+    except Exception as e:
+        logger.error(f"❌ Error evaluando alertas de {archivo}: {e}")
+
+def alertas_vuelos(archivo, vuelos, fecha_base=None):
+    evaluar_publicacion(archivo, instantes_vuelos(vuelos, fecha_base or hoy_local()))
+
+def alertas_trenes(archivo, trenes):
+    evaluar_publicacion(archivo, instantes_trenes(trenes, ahora_local()))
+
+def alertas_cruceros(archivo, data):
+    evaluar_publicacion(archivo, instantes_cruceros(data))
+
+# =============================================================================
+# FUSIÓN TRAS UN CONFLICTO DE GIT
+# =============================================================================
+# Vuelos, trenes y cruceros se publican desde workflows distintos que
+# comparten alertas.json y alertas_estado.json. Si dos ejecuciones chocan al
+# subir, ninguna de las dos versiones vale entera: cada una trae al día solo
+# los feeds que ha evaluado.
+def fusionar_estados(local, remoto):
+    """Por feed, la entrada evaluada más tarde; en empate, la local."""
+    feeds = dict(remoto.get('feeds', {}))
+    for feed, e in local.get('feeds', {}).items():
+        if feed not in feeds or e.get('evaluado', '') >= feeds[feed].get('evaluado', ''):
+            feeds[feed] = e
+    return {'actualizado': max(local.get('actualizado', ''), remoto.get('actualizado', '')),
+            'feeds': feeds}
+
+def fusionar_alertas(local, remoto):
+    """Unión por id, en orden cronológico y recortada a max_alertas."""
+    por_id = {a['id']: a for a in remoto.get('alertas', []) + local.get('alertas', [])}
+    alertas = sorted(por_id.values(), key=lambda a: a['time'])
+    return {'actualizado': max(local.get('actualizado', ''), remoto.get('actualizado', '')),
+            'alertas': alertas[-ALERTS.get('max_alertas', 50):]}
+
+def fusionar_archivo(destino, archivo_local, archivo_remoto):
+    """Escribe en `destino` la fusión de las dos versiones del archivo."""
+    local = load_existing_or_default(archivo_local, default={}) or {}
+    remoto = load_existing_or_default(archivo_remoto, default={}) or {}
+    fusion = fusionar_estados if 'feeds' in local or 'feeds' in remoto else fusionar_alertas
+    success, message = safe_save_json(
+        filepath=destino,
+        data=fusion(local, remoto),
+        data_type='generic',
+        backup=False
+    )
+    if not success:
+        logger.error(message)
+    return success
+
+if __name__ == "__main__":
+    # Uso: python scripts/alertas.py --fusionar <destino> <versión local> <versión remota>
+    if len(sys.argv) != 5 or sys.argv[1] != '--fusionar':
+        print("Uso: python scripts/alertas.py --fusionar <destino> <local> <remoto>")
+        sys.exit(2)
+    sys.exit(0 if fusionar_archivo(*sys.argv[2:]) else 1)
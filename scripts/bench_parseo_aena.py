@@ -0,0 +1,141 @@
+"""
+=============================================================================
+BENCH PARSEO AENA - Tokenizador V5 vs parser V4
+=============================================================================
+Descripción: Reconstruye filas de infovuelos a partir de los backups de
+             public/backups/vuelos_*.json, comprueba que parsear_fila_aena_v5
+             devuelve exactamente lo mismo que el parser V4 original y mide
+             el tiempo de ambos.
+Uso:         python scripts/bench_parseo_aena.py [repeticiones]
+"""
+
+import gc
+import glob
+import json
+import os
+import re
+import sys
+import time
+
+from config import PUBLIC_DIR
+from aena_scrap import parsear_fila_aena_v5
+
+# =============================================================================
+# REFERENCIA: PARSER V4 (copia literal del original)
+# =============================================================================
+def parsear_fila_aena_v4(texto_fila, hora_detectada):
+    partes = [p.strip() for p in texto_fila.split(" | ")]
+    obj = {
+        "hora": hora_detectada, "vuelo": "N/A", "aerolinea": "N/A",
+        "origen": "N/A", "terminal": "N/A", "sala": "", "estado": "Programado"
+    }
+    BLACKLIST_ESTADO = ["EN HORA", "RETRASADO", "ATERRIZADO", "PROGRAMADO", 
+                        "CANCELADO", "DESVIADO", "SALA", "CINTA", "LLEGADA", 
+                        "FINALIZADO", "OPERANDO", "EMBARCANDO", "ÚLTIMA LLAMADA"]
+    # Estado
+    if len(partes) > 0:
+        ultimo = partes[-1].upper()
+        if any(x in ultimo for x in BLACKLIST_ESTADO):
+            obj["estado"] = partes[-1]
+        elif len(partes) > 1:
+            penultimo = partes[-2].upper()
+            if any(x in penultimo for x in BLACKLIST_ESTADO):
+                obj["estado"] = partes[-2]
+    # Terminal
+    idx_terminal = -1
+    for i, p in enumerate(partes):
+        p_upper = p.upper()
+        if p_upper in ["T1", "T2", "TERMINAL T1", "TERMINAL T2"]:
+            obj["terminal"] = "T1" if "T1" in p_upper else "T2"
+            idx_terminal = i
+            break
+    # Sala
+    if idx_terminal != -1 and len(partes) > idx_terminal + 1:
+        posible_sala = partes[idx_terminal + 1]
+        if len(posible_sala) < 6: 
+            obj["sala"] = posible_sala
+            if obj["terminal"] == "T2" and "C" in posible_sala.upper():
+                obj["terminal"] = "T2C (EasyJet)"
+            elif obj["terminal"] == "T2":
+                obj["terminal"] = f"T2{posible_sala}"
+    # Vuelo y Origen
+    for i, p in enumerate(partes):
+        if re.match(r"^[A-Z]{2,3}\d{3,4}$", p):
+            obj["vuelo"] = p
+            if i + 1 < len(partes):
+                candidato_origen = partes[i+1]
+                es_hora = ":" in candidato_origen
+                es_terminal = "T1" in candidato_origen or "T2" in candidato_origen
+                es_estado = any(x in candidato_origen.upper() for x in BLACKLIST_ESTADO)
+                if not es_hora and not es_terminal and not es_estado:
+                    obj["origen"] = candidato_origen
+            break 
+    return obj
+
+# =============================================================================
+# CORPUS
+# =============================================================================
+def filas_desde_registro(v):
+    """Variantes de fila (como las une el scraper con " | ") para un vuelo guardado."""
+    terminal = v['terminal'][:2] if v['terminal'] != "N/A" else ""
+    sala = v['sala'] if v['sala'] not in ("", "-") else "-"
+    filas = []
+    for codigo in v['vuelo'].split(' / '):
+        base = [v['hora'], codigo, v['origen']]
+        filas.append(base + [terminal, sala, v['estado']])
+        filas.append(base + [f"Terminal {terminal}" if terminal else "", sala, v['estado'], "Ver detalle"])
+        filas.append([v['hora'], codigo, v['hora'], v['origen'], v['estado'].upper()])
+        filas.append([v['hora'], v['origen'], codigo, terminal, f"SALA {sala}"])
+    return [" | ".join(p for p in fila if p) for fila in filas]
+
+def cargar_corpus():
+    filas = []
+    for ruta in sorted(glob.glob(os.path.join(str(PUBLIC_DIR), 'backups', 'vuelos_*.json'))):
+        try:
+            with open(ruta, encoding='utf-8') as f:
+                vuelos = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for v in vuelos:
+            for texto in filas_desde_registro(v):
+                filas.append((texto, v['hora']))
+    return filas
+
+# =============================================================================
+# EJECUCIÓN
+# =============================================================================
+def medir(parser, filas, repeticiones):
+    # Como timeit: sin GC durante la medida (el corpus son millones de tuplas)
+    gc.collect()
+    gc.disable()
+    try:
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            for texto, hora in filas:
+                parser(texto, hora)
+        return time.perf_counter() - inicio
+    finally:
+        gc.enable()
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    filas = cargar_corpus()
+    if not filas:
+        print("❌ No hay backups de vuelos en public/backups")
+        sys.exit(1)
+
+    distintas = [(t, h) for t, h in filas if parsear_fila_aena_v4(t, h) != parsear_fila_aena_v5(t, h)]
+    if distintas:
+        print(f"❌ {len(distintas)} filas con salida distinta. Ejemplo: {distintas[0][0]}")
+        sys.exit(1)
+    print(f"✅ {len(filas)} filas: salida idéntica V4 / V5")
+
+    t_v4 = medir(parsear_fila_aena_v4, filas, repeticiones)
+    t_v5 = medir(parsear_fila_aena_v5, filas, repeticiones)
+    total = len(filas) * repeticiones
+    print(f"⏱️ V4: {t_v4:.2f}s ({total / t_v4:,.0f} filas/s)")
+    print(f"⏱️ V5: {t_v5:.2f}s ({total / t_v5:,.0f} filas/s)")
+    print(f"🚀 Speedup: x{t_v4 / t_v5:.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+"""
+=============================================================================
+BROWSER UTILS - Fábrica de drivers Selenium compartida por los scrapers
+=============================================================================
+Descripción: Creación de Chrome headless con la configuración común de los
+             scrapers (AENA, ADIF, licencias), bloqueo de recursos no
+             esenciales vía DevTools (imágenes, fuentes, consent, analítica),
+             esperas por eventos del DOM/red en lugar de sleeps fijos,
+             extracción masiva de filas con un único execute_script y
+             captura de respuestas XHR desde el performance log.
+"""
+
+import base64
+import json
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.support.ui import WebDriverWait
+from webdriver_manager.chrome import ChromeDriverManager
+
+from config import NETWORK_BLOCKING, TIMEOUTS
+from utils import setup_logger
+
+logger = setup_logger('Browser')
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# =============================================================================
+# BLOQUEO DE RED
+# =============================================================================
+# Familias de recursos -> patrones de URL para Network.setBlockedURLs
+PATRONES_POR_TIPO = {
+    'image': ['*.png*', '*.jpg*', '*.jpeg*', '*.gif*', '*.webp*', '*.svg*', '*.ico*', '*.avif*'],
+    'font': ['*.woff*', '*.woff2*', '*.ttf*', '*.otf*', '*.eot*'],
+    'media': ['*.mp4*', '*.webm*', '*.mp3*', '*.m3u8*'],
+    'stylesheet': ['*.css*'],
+}
+
+def _config_bloqueo(sitio: str) -> Tuple[List[str], List[str]]:
+    """
+    (tipos, hosts) efectivos de un sitio.
+    Los 'tipos' del sitio sustituyen a los de 'default'; los 'hosts' se suman.
+    """
+    base = NETWORK_BLOCKING.get('default', {})
+    conf = NETWORK_BLOCKING.get(sitio, {})
+    tipos = conf.get('tipos', base.get('tipos', []))
+    return tipos, base.get('hosts', []) + conf.get('hosts', [])
+
+def patrones_bloqueo(sitio: str) -> List[str]:
+    """Devuelve la lista de patrones bloqueados para un sitio."""
+    tipos, hosts = _config_bloqueo(sitio)
+    patrones = []
+    for tipo in tipos:
+        patrones.extend(PATRONES_POR_TIPO.get(tipo, []))
+    patrones.extend(hosts)
+
+    # Sin duplicados, manteniendo el orden
+    return list(dict.fromkeys(patrones))
+
+def aplicar_bloqueo_red(driver: webdriver.Chrome, sitio: str) -> bool:
+    """
+    Activa la intercepción de red de DevTools con la blocklist del sitio.
+    Se puede volver a llamar antes de cada driver.get() para cambiar de sitio
+    (setBlockedURLs sustituye la lista anterior).
+    """
+    patrones = patrones_bloqueo(sitio)
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patrones})
+        logger.debug(f"🚫 [{sitio}] {len(patrones)} patrones de red bloqueados")
+        return True
+    except Exception as e:
+        # Si el CDP no está disponible seguimos sin bloqueo
+        logger.warning(f"⚠️ [{sitio}] No se pudo activar el bloqueo de red: {e}")
+        return False
+
+# =============================================================================
+# FÁBRICA DE DRIVERS
+# =============================================================================
+_RUTA_CHROMEDRIVER = None
+_CANDADO_CHROMEDRIVER = threading.Lock()
+
+def ruta_chromedriver() -> str:
+    """
+    Ruta del chromedriver, resuelta una sola vez por proceso. Los pools de
+    feeds crean drivers desde varios hilos a la vez y ChromeDriverManager
+    no es seguro ante descargas concurrentes a la misma cache.
+    """
+    global _RUTA_CHROMEDRIVER
+    with _CANDADO_CHROMEDRIVER:
+        if _RUTA_CHROMEDRIVER is None:
+            _RUTA_CHROMEDRIVER = ChromeDriverManager().install()
+        return _RUTA_CHROMEDRIVER
+
+def crear_driver(
+    sitio: str,
+    headless: bool = True,
+    headless_arg: str = '--headless',
+    stealth: bool = False,
+    extra_args: Optional[List[str]] = None,
+    capabilities: Optional[Dict] = None
+) -> webdriver.Chrome:
+    """
+    Crea un Chrome con la configuración común de los scrapers y la
+    blocklist de red del sitio ya aplicada.
+
+    Args:
+        sitio: Clave en config.NETWORK_BLOCKING
+        headless: Ejecutar sin ventana
+        headless_arg: '--headless' (clásico) o '--headless=new'
+        stealth: Ocultar huellas de automatización (licencias)
+        extra_args: Argumentos adicionales de Chrome
+        capabilities: Capabilities extra (p.ej. 'goog:loggingPrefs')
+    """
+    options = Options()
+    if headless:
+        options.add_argument(headless_arg)
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--window-size=1920,1080')
+    options.add_argument(f"user-agent={USER_AGENT}")
+    for arg in extra_args or []:
+        options.add_argument(arg)
+
+    # Las imágenes también se cortan a nivel de perfil (no llegan ni a pedirse)
+    tipos, _ = _config_bloqueo(sitio)
+    if 'image' in tipos:
+        options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+
+    if stealth:
+        options.add_argument('--disable-blink-features=AutomationControlled')
+        options.add_experimental_option('excludeSwitches', ['enable-automation'])
+        options.add_experimental_option('useAutomationExtension', False)
+
+    for key, value in (capabilities or {}).items():
+        options.set_capability(key, value)
+
+    driver = webdriver.Chrome(service=Service(ruta_chromedriver()), options=options)
+
+    if stealth:
+        driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
+            'source': '''
+                Object.defineProperty(navigator, 'webdriver', {get: () => undefined});
+                Object.defineProperty(navigator, 'plugins', {get: () => [1, 2, 3, 4, 5]});
+            '''
+        })
+
+    # Contador de XHR/fetch en vuelo para esperar_red_inactiva()
+    driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': JS_MONITOR_RED})
+
+    aplicar_bloqueo_red(driver, sitio)
+    return driver
+
+# =============================================================================
+# ESPERAS POR EVENTOS (sustituyen a time.sleep fijos)
+# =============================================================================
+JS_MONITOR_RED = """
+(function() {
+    if (window.__scraperRed) return;
+    var r = window.__scraperRed = {pendientes: 0, ultimo: Date.now()};
+    var send = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function() {
+        r.pendientes++; r.ultimo = Date.now();
+        this.addEventListener('loadend', function() { r.pendientes--; r.ultimo = Date.now(); });
+        return send.apply(this, arguments);
+    };
+    if (window.fetch) {
+        var f = window.fetch;
+        window.fetch = function() {
+            r.pendientes++; r.ultimo = Date.now();
+            return f.apply(this, arguments).finally(function() { r.pendientes--; r.ultimo = Date.now(); });
+        };
+    }
+})();
+"""
+
+JS_DOM_QUIETO = """
+var quietud = arguments[0], limite = arguments[1], selector = arguments[2];
+var done = arguments[arguments.length - 1];
+var raiz = selector ? document.querySelector(selector) : document.body;
+if (!raiz) { done(false); return; }
+var timer = null, tope = null;
+var obs = new MutationObserver(function() { clearTimeout(timer); timer = setTimeout(fin, quietud); });
+function fin() { obs.disconnect(); clearTimeout(tope); done(true); }
+tope = setTimeout(function() { obs.disconnect(); clearTimeout(timer); done(false); }, limite);
+obs.observe(raiz, {childList: true, subtree: true, characterData: true});
+timer = setTimeout(fin, quietud);
+"""
+
+JS_CONTAR = """
+var selector = arguments[0], xpath = arguments[1];
+if (xpath) {
+    return document.evaluate('count(' + selector + ')', document, null, XPathResult.NUMBER_TYPE, null).numberValue;
+}
+return document.querySelectorAll(selector).length;
+"""
+
+def contar_elementos(driver: webdriver.Chrome, selector: str, xpath: bool = False) -> int:
+    """Cuenta elementos en el navegador con un único round-trip."""
+    try:
+        return int(driver.execute_script(JS_CONTAR, selector, xpath) or 0)
+    except Exception:
+        return 0
+
+def esperar_documento(driver: webdriver.Chrome, timeout: float = None) -> bool:
+    """Espera a document.readyState == 'complete'."""
+    timeout = timeout or TIMEOUTS.get('page_load', 20)
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.1).until(
+            lambda d: d.execute_script("return document.readyState") == 'complete'
+        )
+        return True
+    except TimeoutException:
+        return False
+
+def esperar_crecimiento_filas(
+    driver: webdriver.Chrome,
+    selector: str,
+    n_anterior: int = 0,
+    timeout: float = None,
+    xpath: bool = False
+) -> int:
+    """
+    Espera a que el número de elementos que casan con el selector supere
+    n_anterior. Devuelve el nuevo recuento (o el actual si vence el timeout).
+    """
+    timeout = timeout or TIMEOUTS.get('element_wait', 10)
+
+    def _crecio(d):
+        n = contar_elementos(d, selector, xpath)
+        return n if n > n_anterior else False
+
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=0.1).until(_crecio)
+    except TimeoutException:
+        return contar_elementos(driver, selector, xpath)
+
+def esperar_dom_estable(
+    driver: webdriver.Chrome,
+    quietud: float = None,
+    timeout: float = None,
+    selector: Optional[str] = None
+) -> bool:
+    """
+    Espera a que el DOM (o el subárbol del selector) pase `quietud` segundos
+    sin mutaciones, usando un MutationObserver en la página.
+    """
+    quietud = quietud or TIMEOUTS.get('dom_quiet', 0.4)
+    timeout = timeout or TIMEOUTS.get('element_wait', 10)
+    try:
+        driver.set_script_timeout(timeout + 5)
+        return bool(driver.execute_async_script(
+            JS_DOM_QUIETO, int(quietud * 1000), int(timeout * 1000), selector
+        ))
+    except Exception:
+        return False
+
+def esperar_red_inactiva(driver: webdriver.Chrome, quietud: float = None, timeout: float = None) -> bool:
+    """
+    Espera a que no haya XHR/fetch en vuelo durante `quietud` segundos.
+    Si la página no tiene el monitor (p.ej. driver ajeno) lo instala y solo
+    vigila las peticiones posteriores.
+    """
+    quietud = quietud or TIMEOUTS.get('dom_quiet', 0.4)
+    timeout = timeout or TIMEOUTS.get('element_wait', 10)
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            estado = driver.execute_script(
+                "var r = window.__scraperRed; return r ? [r.pendientes, Date.now() - r.ultimo] : null;"
+            )
+            if estado is None:
+                driver.execute_script(JS_MONITOR_RED)
+            elif estado[0] <= 0 and estado[1] >= quietud * 1000:
+                return True
+        except Exception:
+            return False
+        time.sleep(0.1)
+    return False
+
+def esperar_pagina_lista(driver: webdriver.Chrome, timeout: float = None) -> bool:
+    """readyState completo + red inactiva: sustituto del sleep tras driver.get()."""
+    timeout = timeout or TIMEOUTS.get('page_load', 20)
+    return esperar_documento(driver, timeout) and esperar_red_inactiva(driver, timeout=timeout)
+
+# =============================================================================
+# EXTRACCIÓN MASIVA EN PÁGINA (un único execute_script por página)
+# =============================================================================
+JS_EXTRAER_ANCLAS = """
+var xp = arguments[0], niveles = arguments[1], modo = arguments[2];
+var snap = document.evaluate(xp, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+var out = [], filas = [];
+for (var i = 0; i < snap.snapshotLength; i++) {
+    var el = snap.snapshotItem(i), fila = el;
+    for (var n = 0; n < niveles && fila.parentElement; n++) fila = fila.parentElement;
+    if (modo) {
+        if (fila.__scrVisto) continue;
+        fila.__scrVisto = true;
+        filas.push(fila);
+    }
+    var partes = (fila.innerText || '').split(/[\\n\\t]+/).map(function(p) { return p.trim(); })
+        .filter(function(p) { return p.length > 0; });
+    out.push({ancla: (el.innerText || el.textContent || '').trim(), partes: partes});
+}
+if (modo === 'podar') filas.forEach(function(f) { f.remove(); });
+return out;
+"""
+
+JS_EXTRAER_TEXTOS = """
+var selectores = arguments[0], out = [];
+selectores.forEach(function(sel) {
+    document.querySelectorAll(sel).forEach(function(el) {
+        var a = el.querySelector('a[href]');
+        out.push({texto: (el.innerText || '').trim(), href: a ? a.href : null});
+    });
+});
+return out;
+"""
+
+def extraer_filas_ancla(
+    driver: webdriver.Chrome,
+    xpath_ancla: str,
+    niveles: int = 2,
+    modo: Optional[str] = None
+) -> List[Dict]:
+    """
+    Para cada elemento ancla (p.ej. la celda de hora) sube `niveles` padres y
+    devuelve {'ancla': texto_ancla, 'partes': [líneas no vacías de la fila]}.
+
+    modo=None devuelve todas las anclas. Con 'marcar' o 'podar' actúa como
+    cursor: cada fila se devuelve una sola vez (primera ancla) y después se
+    marca como vista o se elimina del DOM para que la página no crezca.
+    """
+    try:
+        return driver.execute_script(JS_EXTRAER_ANCLAS, xpath_ancla, niveles, modo) or []
+    except Exception as e:
+        logger.warning(f"⚠️ Extracción masiva fallida ({xpath_ancla}): {e}")
+        return []
+
+def extraer_textos(driver: webdriver.Chrome, selectores: List[str]) -> List[Dict]:
+    """
+    Texto visible y primer enlace de todos los elementos de cada selector,
+    en orden de selector: [{'texto': str, 'href': str|None}, ...].
+    """
+    try:
+        return driver.execute_script(JS_EXTRAER_TEXTOS, list(selectores)) or []
+    except Exception as e:
+        logger.warning(f"⚠️ Extracción masiva fallida ({selectores}): {e}")
+        return []
+
+# =============================================================================
+# CAPTURA DE RESPUESTAS XHR (performance log de Chrome)
+# =============================================================================
+# Requiere crear el driver con capabilities=CAPS_PERFORMANCE_LOG
+CAPS_PERFORMANCE_LOG = {'goog:loggingPrefs': {'performance': 'ALL'}}
+
+def capturar_respuestas_red(driver: webdriver.Chrome, filtro_url: str, solo_json: bool = True) -> List[Dict]:
+    """
+    Lee (y vacía) el performance log y devuelve el cuerpo de las respuestas
+    terminadas cuya URL contiene `filtro_url`: [{'url': str, 'body': str}, ...].
+    Cada llamada solo ve las respuestas nuevas desde la llamada anterior.
+    """
+    try:
+        entradas = driver.get_log('performance')
+    except Exception as e:
+        logger.warning(f"⚠️ Performance log no disponible: {e}")
+        return []
+
+    candidatas = {}
+    terminadas = set()
+    for entrada in entradas:
+        try:
+            msg = json.loads(entrada['message'])['message']
+        except (KeyError, ValueError):
+            continue
+        metodo = msg.get('method')
+        params = msg.get('params', {})
+        if metodo == 'Network.responseReceived':
+            resp = params.get('response', {})
+            url = resp.get('url', '')
+            if filtro_url not in url:
+                continue
+            if solo_json and 'json' not in (resp.get('mimeType') or ''):
+                continue
+            candidatas[params.get('requestId')] = url
+        elif metodo == 'Network.loadingFinished':
+            terminadas.add(params.get('requestId'))
+
+    respuestas = []
+    for request_id, url in candidatas.items():
+        if request_id not in terminadas:
+            continue
+        try:
+            cuerpo = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+            body = cuerpo.get('body', '')
+            if cuerpo.get('base64Encoded'):
+                body = base64.b64decode(body).decode('utf-8', errors='replace')
+            respuestas.append({'url': url, 'body': body})
+        except Exception as e:
+            logger.debug(f"Cuerpo no disponible para {url}: {e}")
+    return respuestas
@@ -21,20 +21,39 @@ PUBLIC_DIR = PROJECT_ROOT / 'public'
 OUTPUT_FILES = {
     # Vuelos AENA (scraper)
     'vuelos_aena': PUBLIC_DIR / 'vuelos.json',
+    'vuelos_aena_meta': PUBLIC_DIR / 'vuelos_meta.json',  # Fecha base de dia_relativo
+    'vuelos_hot': PUBLIC_DIR / 'vuelos_hot.json',         # Llegadas inminentes (job hot)
+    'vuelos_aena_checkpoint': PROJECT_ROOT / 'aena_checkpoint.json',  # Reanudar scraping DOM
+    'vuelos_salidas': PUBLIC_DIR / 'vuelos_salidas.json',
+    'vuelos_salidas_meta': PUBLIC_DIR / 'vuelos_salidas_meta.json',
 
     # Trenes ADIF (scraper)
     'trenes_sants': PUBLIC_DIR / 'trenes_sants.json',
+    'trenes_sants_salidas': PUBLIC_DIR / 'trenes_sants_salidas.json',
+    'trenes_franca': PUBLIC_DIR / 'trenes_franca.json',
+    'trenes_pgracia': PUBLIC_DIR / 'trenes_pgracia.json',
+    'trenes': PUBLIC_DIR / 'trenes.json',  # Feed fusionado (todas las estaciones)
+    'trenes_agregados': PUBLIC_DIR / 'trenes_agregados.json',  # Por hora / ciudad / operador
 
     # Cruceros Port de Barcelona (scraper)
     'cruceros': PUBLIC_DIR / 'cruceros.json',
+    'cruceros_cache': PROJECT_ROOT / 'cruceros_cache.json',  # ETag/Last-Modified por CSV
+    'barcos_cache': PROJECT_ROOT / 'barcos_cache.json',      # Clasificación por IMO/MMSI
+    'cruceros_archivo': PROJECT_ROOT / 'archivo_cruceros',   # Escalas por mes (columnar)
+    'cruceros_semana': PUBLIC_DIR / 'cruceros_semana.json',  # Calendario 7 días
 
     # Licencias (scraper raw)
     'licencias_raw': PROJECT_ROOT / 'licencias_totales.json',
+    'licencias_cache': PROJECT_ROOT / 'licencias_cache.json',  # Huellas de listados
 
     # Licencias (procesado)
     'licencias_history': PUBLIC_DIR / 'history_stats.csv',
     'licencias_web_feed': PUBLIC_DIR / 'web_feed.json',
 
+    # Alertas disparadas (alertas.py); el estado incremental del motor no se publica
+    'alertas': PUBLIC_DIR / 'alertas.json',
+    'alertas_estado': PROJECT_ROOT / 'alertas_estado.json',
+
     # API Vuelos (update_data)
     'data_api': PUBLIC_DIR / 'data.json',
 }
@@ -43,12 +62,37 @@ OUTPUT_FILES = {
 # APIs Y ENDPOINTS
 # =============================================================================
 URLS = {
-    'adif': 'https://www.adif.es/w/71801-barcelona-sants?pageFromPlid=335',
+    # Tableros ADIF: una entrada por estación, con su archivo por sentido
+    'adif_estaciones': [
+        {
+            'codigo': 'SANTS',
+            'nombre': 'Barcelona-Sants',
+            'url': 'https://www.adif.es/w/71801-barcelona-sants?pageFromPlid=335',
+            'archivos': {
+                'llegadas': OUTPUT_FILES['trenes_sants'],
+                'salidas': OUTPUT_FILES['trenes_sants_salidas'],
+            },
+        },
+        {
+            'codigo': 'FRANCA',
+            'nombre': 'Barcelona-Estació de França',
+            'url': 'https://www.adif.es/w/79400-barcelona-estacio-de-franca',
+            'archivos': {'llegadas': OUTPUT_FILES['trenes_franca']},
+        },
+        {
+            'codigo': 'PGRACIA',
+            'nombre': 'Barcelona-Passeig de Gràcia',
+            'url': 'https://www.adif.es/w/71802-barcelona-passeig-de-gracia',
+            'archivos': {'llegadas': OUTPUT_FILES['trenes_pgracia']},
+        },
+    ],
     'aena': 'https://www.aena.es/es/infovuelos.html',
     'aviation_api': 'http://api.aviationstack.com/v1/flights',
     # Port de Barcelona Open Data - Cruceros
     'cruceros_llegadas': 'https://opendata.portdebarcelona.cat/dataset/342fe09b-017b-4019-a743-ee773f09befd/resource/72f0fc9e-b4b4-4a61-a0fb-e7b65b601b4d/download/arribadesavui.csv',
     'cruceros_salidas': 'https://opendata.portdebarcelona.cat/dataset/342fe09b-017b-4019-a743-ee773f09befd/resource/4bf1ccd0-5132-4d54-81d4-1ab72d5542e9/download/sortidesavui.csv',
+    # Programación a varios días (mismo formato CSV). Vacío = solo el día
+    'cruceros_programacion': os.environ.get('PORT_CRUISE_SCHEDULE_URL', ''),
 }
 
 # =============================================================================
@@ -59,7 +103,8 @@ TIMEOUTS = {
     'element_wait': 10,     # Segundos para esperar elemento
     'api_request': 60,      # Segundos para requests API
     'scroll_wait': 1.5,     # Segundos entre scrolls
-    'click_wait': 3.0,      # Segundos después de click
+    'click_wait': 3.0,      # Máximo a esperar filas nuevas tras un click
+    'dom_quiet': 0.4,       # Segundos sin mutaciones/peticiones = DOM listo
 }
 
 LIMITS = {
@@ -67,8 +112,13 @@ LIMITS = {
     'max_api_pages': 10,        # Páginas máximas de API
     'min_flights_valid': 10,    # Mínimo vuelos para considerar válido
     'min_trains_valid': 5,      # Mínimo trenes para considerar válido
+    'train_retention_minutes': 60,  # Trenes ya llegados que se conservan en el feed
     'min_licenses_valid': 3,    # Mínimo licencias para considerar válido
     'min_cruises_valid': 0,     # Puede haber días sin cruceros
+    'license_cache_ttl_hours': 72,  # Caducidad de la cache de huellas de licencias
+    'vessel_cache_ttl_days': 365,   # Barcos sin escala en este plazo salen de la cache
+    'flight_events_max': 300,           # Eventos guardados en <feed>_events.json
+    'flight_events_max_age_hours': 24,  # Antigüedad máxima de un evento
 }
 
 # =============================================================================
@@ -87,6 +137,217 @@ VALIDATION = {
         "AVE", "AVLO", "OUIGO", "IRYO", "ALVIA", 
         "EUROMED", "INTERCITY", "TGV", "LD", "MD", "AVANT"
     ],
+    # Servicios que nunca cuentan aunque contengan una marca de la whitelist
+    'train_blacklist': ["RODALIES", "CERCANIAS"],
+}
+
+# =============================================================================
+# AENA (infovuelos)
+# =============================================================================
+AENA = {
+    # 'dom': scraping clásico del texto renderizado (por defecto)
+    # 'xhr': captura el JSON de infovuelos (fallback a 'dom' si no hay datos).
+    #        Opt-in (AENA_MODE=xhr) hasta validar CAMPOS_JSON contra una
+    #        respuesta real capturada: las claves actuales son candidatas.
+    'extraction_mode': os.environ.get('AENA_MODE', 'dom'),
+    # Fragmento de URL de las respuestas JSON a capturar
+    'xhr_url_filter': 'infovuelos',
+    # Modo DOM: eliminar del DOM las filas ya procesadas tras cada click
+    'dom_pruning': True,
+    # 'full': 24h completas en cada run | 'delta': solo hasta solapar con lo previo
+    'refresh_mode': os.environ.get('AENA_REFRESH', 'delta'),
+    'delta_hot_hours': 3,         # Próximas horas que se refrescan siempre
+    'delta_full_every_hours': 6,  # Pasada completa periódica (horizonte 24h)
+    # Job hot (aena_hot.py): primeras páginas cada 5-10 min
+    'hot_max_clicks': 1,          # Clicks de "ver más" (1 = dos páginas)
+    'hot_window_minutes': 90,     # Ventana publicada en vuelos_hot.json
+    # Checkpoint del scraping DOM (reanudar tras crash de Chrome)
+    'checkpoint_every_clicks': 10,
+    'checkpoint_ttl_minutes': 30,  # Más antiguo = se empieza de cero
+    # Feeds de infovuelos. Los activos se scrapean en paralelo (un Chrome por feed)
+    'sentidos_activos': [s.strip() for s in os.environ.get('AENA_SENTIDOS', 'llegadas,salidas').split(',') if s.strip()],
+    'sentidos': {
+        'llegadas': {
+            'placeholder': 'llegada',   # Input del buscador donde se escribe el aeropuerto
+            'campo_otro': 'origen',     # Nombre publicado del otro aeropuerto
+        },
+        'salidas': {
+            'placeholder': 'salida',
+            'campo_otro': 'destino',
+        },
+    },
+    # Aeropuertos a scrapear (claves de AEROPUERTOS) y Chromes simultáneos máximos
+    'aeropuertos_activos': [a.strip() for a in os.environ.get('AENA_AEROPUERTOS', 'BCN').split(',') if a.strip()],
+    'max_navegadores': int(os.environ.get('AENA_MAX_BROWSERS', 4)),
+}
+
+# Un feed por aeropuerto y sentido. 'archivos' da el JSON publicado; su meta
+# (fecha base de dia_relativo + métricas) va al lado como <nombre>_meta.json.
+# 'reglas_sala': por terminal base, (subcadena de la sala, plantilla) en orden;
+# la primera que aparece en la sala decide la terminal publicada.
+AEROPUERTOS = {
+    'BCN': {
+        'nombre': 'JOSEP TARRADELLAS BARCELONA-EL PRAT',
+        'terminal_defecto': None,
+        'reglas_sala': {'T2': [('C', 'T2C (EasyJet)'), ('', 'T2{sala}')]},
+        'min_clicks': 70,   # ~24h de llegadas antes de aceptar el cierre de día
+        'archivos': {
+            'llegadas': OUTPUT_FILES['vuelos_aena'],
+            'salidas': OUTPUT_FILES['vuelos_salidas'],
+        },
+        # Endpoint JSON directo (sin navegador). Vacío = descubrirlo vía XHR
+        'api_url': {
+            'llegadas': os.environ.get('AENA_API_URL', ''),
+            'salidas': os.environ.get('AENA_API_URL_SALIDAS', ''),
+        },
+    },
+    # Cobertura de verano: terminal única
+    'GRO': {
+        'nombre': 'GIRONA-COSTA BRAVA',
+        'terminal_defecto': 'T1',
+        'reglas_sala': {},
+        'min_clicks': 0,
+        'archivos': {
+            'llegadas': PUBLIC_DIR / 'vuelos_gro.json',
+            'salidas': PUBLIC_DIR / 'vuelos_salidas_gro.json',
+        },
+        'api_url': {},
+    },
+    'REU': {
+        'nombre': 'REUS',
+        'terminal_defecto': 'T1',
+        'reglas_sala': {},
+        'min_clicks': 0,
+        'archivos': {
+            'llegadas': PUBLIC_DIR / 'vuelos_reu.json',
+            'salidas': PUBLIC_DIR / 'vuelos_salidas_reu.json',
+        },
+        'api_url': {},
+    },
+}
+
+# =============================================================================
+# ADIF (tablero de Sants)
+# =============================================================================
+ADIF = {
+    # 'requests': formularios del portlet por HTTP (fallback a Selenium)
+    # 'selenium': siempre con Chrome
+    'mode': os.environ.get('ADIF_MODE', 'requests'),
+    'max_pages': 30,    # Envíos máximos de "Cargar más"
+    # Estaciones activas (códigos de URLS['adif_estaciones'])
+    'estaciones_activas': [e.strip() for e in os.environ.get('ADIF_ESTACIONES', 'SANTS,FRANCA,PGRACIA').split(',') if e.strip()],
+    # Chromes simultáneos como máximo para los fallbacks a Selenium
+    'max_navegadores': int(os.environ.get('ADIF_MAX_BROWSERS', '2')),
+    # Por sentido: campo de la otra estación (los ids del tablero llevan el sentido)
+    'sentidos': {
+        'llegadas': {'campo_otro': 'origen'},
+        'salidas': {'campo_otro': 'destino'},
+    },
+}
+
+# =============================================================================
+# TRENES (demanda: trenes_demanda.py, agregados: trenes_agregados.py)
+# =============================================================================
+# Pasajeros estimados = plazas x unidades x ocupación(franja) x factor del servicio
+# (con tope en el 100%). 'unidades': número fijo o por franja (doble composición).
+TRAINS = {
+    'servicios': {
+        'AVE': {'plazas': 404, 'unidades': {'defecto': 1, 'punta_manana': 2, 'punta_tarde': 2}},  # S-103 / S-112, doble en punta
+        'AVLO': {'plazas': 438, 'unidades': 1},
+        'OUIGO': {'plazas': 509, 'unidades': 1},        # Euroduplex
+        'IRYO': {'plazas': 457, 'unidades': 1},         # Frecciarossa 1000
+        'TGV': {'plazas': 509, 'unidades': 1},
+        'EUROMED': {'plazas': 300, 'unidades': 1},
+        'AVANT': {'plazas': 237, 'unidades': {'defecto': 1, 'punta_manana': 2, 'punta_tarde': 2}},
+        'ALVIA': {'plazas': 265, 'unidades': 1},
+        'INTERCITY': {'plazas': 260, 'unidades': 1},
+        'MD': {'plazas': 200, 'unidades': {'defecto': 1, 'punta_manana': 2, 'punta_tarde': 2}},
+    },
+    'servicio_defecto': {'plazas': 300, 'unidades': 1},
+    # Franjas horarias: (hora de inicio, nombre), ordenadas
+    'franjas': [(0, 'madrugada'), (7, 'punta_manana'), (10, 'valle'), (16, 'punta_tarde'), (21, 'noche')],
+    'ocupacion': {'madrugada': 0.45, 'punta_manana': 0.85, 'valle': 0.65, 'punta_tarde': 0.85, 'noche': 0.6},
+    # Low cost: ocupación por encima de la media; regionales por debajo
+    'factor_servicio': {'AVLO': 1.15, 'OUIGO': 1.15, 'IRYO': 1.05, 'MD': 0.8, 'AVANT': 0.9},
+}
+
+# =============================================================================
+# BLOQUEO DE RED (Selenium / DevTools)
+# =============================================================================
+# Recursos que los scrapers headless no necesitan. Se cancelan vía CDP
+# (Network.setBlockedURLs) antes de navegar. 'tipos' referencia las familias
+# de browser_utils.PATRONES_POR_TIPO; 'hosts' son patrones de URL de terceros.
+NETWORK_BLOCKING = {
+    'default': {
+        'tipos': ['image', 'font', 'media'],
+        'hosts': [
+            '*onetrust.com*', '*cookielaw.org*',            # Consent OneTrust
+            '*didomi.io*', '*privacy-center.org*',          # Consent Didomi
+            '*googletagmanager.com*', '*google-analytics.com*',
+            '*doubleclick.net*', '*googlesyndication.com*',
+            '*facebook.net*', '*connect.facebook.com*',
+            '*hotjar.com*', '*clarity.ms*', '*adobedtm.com*',
+            '*youtube.com*', '*ytimg.com*',
+        ],
+    },
+    # AENA y ADIF dependen del CSS para la visibilidad de "ver más"/"Cargar más"
+    'aena': {'tipos': ['image', 'font', 'media'], 'hosts': ['*demdex.net*', '*omtrdc.net*']},
+    'adif': {'tipos': ['image', 'font', 'media'], 'hosts': []},
+    # Licencias: solo leemos texto, se puede cortar también el CSS
+    'milanuncios': {'tipos': ['image', 'font', 'media'], 'hosts': ['*adevinta.com*']},
+    'solano': {'tipos': ['image', 'font', 'media', 'stylesheet'], 'hosts': []},
+    'garcia_bcn': {'tipos': ['image', 'font', 'media', 'stylesheet'], 'hosts': []},
+    'stac': {'tipos': ['image', 'font', 'media', 'stylesheet'], 'hosts': []},
+}
+
+# =============================================================================
+# ALERTAS (motor de reglas: alertas.py)
+# =============================================================================
+# 'feed': nombre del JSON publicado sin extensión (vuelos, trenes_sants, cruceros)
+# 'filtro': campo -> texto que debe contener (sin distinguir mayúsculas)
+# 'agregado': 'count' (número de items) o campo numérico a sumar
+# Una regla se dispara cuando el agregado en [ahora, ahora + ventana_min]
+# alcanza el umbral, y no vuelve a dispararse hasta que deje de cumplirse.
+ALERTS = {
+    'bucket_minutes': 5,     # Resolución temporal del histograma por feed
+    'max_alertas': 50,       # Alertas guardadas en alertas.json
+    'reglas': [
+        {
+            'id': 'pico_t2c', 'tipo': 'flights', 'prioridad': 'high',
+            'feed': 'vuelos', 'filtro': {'terminal': 'T2C'},
+            'ventana_min': 30, 'umbral': 6,
+            'titulo': 'Pico de llegadas en T2C',
+            'mensaje': '{valor} vuelos llegando a T2C en los próximos {ventana_min} min.',
+        },
+        {
+            'id': 'pico_t1', 'tipo': 'flights', 'prioridad': 'medium',
+            'feed': 'vuelos', 'filtro': {'terminal': 'T1'},
+            'ventana_min': 30, 'umbral': 15,
+            'titulo': 'Pico de llegadas en T1',
+            'mensaje': '{valor} vuelos llegando a T1 en los próximos {ventana_min} min.',
+        },
+        {
+            'id': 'banco_ave', 'tipo': 'trains', 'prioridad': 'medium',
+            'feed': 'trenes_sants', 'filtro': {'tren': 'AVE'},
+            'ventana_min': 20, 'umbral': 3,
+            'titulo': 'Banco de AVE en Sants',
+            'mensaje': '{valor} AVE llegando a Sants en los próximos {ventana_min} min.',
+        },
+        {
+            'id': 'oleada_sants', 'tipo': 'trains', 'prioridad': 'medium',
+            'feed': 'trenes_sants', 'filtro': {}, 'agregado': 'pax_estimados',
+            'ventana_min': 30, 'umbral': 1500,
+            'titulo': 'Oleada de viajeros en Sants',
+            'mensaje': '~{valor} viajeros de larga distancia llegan a Sants en {ventana_min} min.',
+        },
+        {
+            'id': 'desembarco_crucero', 'tipo': 'cruises', 'prioridad': 'high',
+            'feed': 'cruceros', 'filtro': {}, 'agregado': 'pax_estimados',
+            'ventana_min': 60, 'umbral': 1500,
+            'titulo': 'Desembarco de cruceros',
+            'mensaje': '~{valor} pasajeros desembarcando en la próxima hora.',
+        },
+    ],
 }
 
 # =============================================================================
@@ -0,0 +1,232 @@
+"""
+=============================================================================
+CRUCEROS ARCHIVO - Histórico de escalas y calendario semanal
+=============================================================================
+Descripción: Archivo columnar de escalas de cruceros/ferries con clave
+             (IMO, fecha, llegada/salida), particionado por mes
+             (archivo_cruceros/AAAA-MM.json). Es append-only por clave: una
+             escala nueva se añade al final de sus columnas y nunca se borra
+             ni se reordena; si vuelve a verse solo se refrescan sus columnas
+             mutables (hora, estado, terminal...).
+             Se alimenta de cada ejecución de cruceros_scrap.py, de la
+             programación a varios días si el Port la publica y, una sola
+             vez, de los backups existentes (public/backups/cruceros_*.json).
+             Las consultas por rango de fechas solo abren los meses
+             implicados y publican el calendario de la semana
+             (public/cruceros_semana.json).
+
+Uso: python scripts/cruceros_archivo.py  (ingesta de backups pendientes + calendario)
+"""
+
+import glob
+import os
+import sys
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# --- IMPORTS ROBUSTEZ ---
+from utils import safe_save_json, setup_logger, load_existing_or_default, ahora_local, hoy_local
+from config import OUTPUT_FILES, PUBLIC_DIR
+
+# --- LOGGER ---
+logger = setup_logger('Cruceros_Archivo')
+
+DIRECTORIO_ARCHIVO = str(OUTPUT_FILES.get('cruceros_archivo', 'archivo_cruceros'))
+ARCHIVO_SEMANA = str(OUTPUT_FILES.get('cruceros_semana', 'cruceros_semana.json'))
+PATRON_BACKUPS = str(PUBLIC_DIR / 'backups' / 'cruceros_*.json')
+
+COLUMNAS = ("fecha", "tipo", "clave_barco", "hora", "nombre", "naviera", "terminal",
+            "terminal_codigo", "eslora", "pax_estimados", "puerto", "estado", "bandera", "imo", "mmsi")
+# Lo que puede cambiar entre la programación y el día de la escala
+MUTABLES = ("hora", "terminal", "terminal_codigo", "eslora", "pax_estimados", "estado")
+
+def clave_escala(escala: Dict) -> str:
+    """La clave de barco de cruceros_scrap o, sin IMO ni MMSI, el nombre."""
+    # Import diferido: cruceros_scrap importa este módulo
+    from cruceros_scrap import clave_barco
+    return clave_barco(escala) or f"NOMBRE:{(escala.get('nombre') or '').upper()}"
+
+# =============================================================================
+# ARCHIVO COLUMNAR
+# =============================================================================
+class ArchivoCruceros:
+    """
+    Particiones mensuales cargadas bajo demanda. Cada partición:
+    {'columnas': {columna: [valores]}}; el índice clave -> fila se
+    reconstruye al cargar (no se persiste).
+    """
+
+    def __init__(self, directorio: str = DIRECTORIO_ARCHIVO):
+        self.directorio = directorio
+        self.particiones: Dict[str, dict] = {}
+        self.modificadas = set()
+
+    def _ruta(self, mes: str) -> str:
+        return os.path.join(self.directorio, f"{mes}.json")
+
+    def _particion(self, mes: str) -> dict:
+        if mes not in self.particiones:
+            datos = load_existing_or_default(self._ruta(mes), default={}) or {}
+            columnas = datos.get('columnas') or {}
+            n = len(columnas.get('fecha', []))
+            columnas = {c: columnas.get(c, [None] * n) for c in COLUMNAS}
+            # Se recalcula al cargar: las particiones antiguas guardaban el IMO sin prefijo
+            columnas['clave_barco'] = [
+                clave_escala({'imo': imo, 'mmsi': mmsi, 'nombre': nombre})
+                for imo, mmsi, nombre in zip(columnas['imo'], columnas['mmsi'], columnas['nombre'])
+            ]
+            indice = {
+                (columnas['clave_barco'][i], columnas['fecha'][i], columnas['tipo'][i]): i
+                for i in range(n)
+            }
+            self.particiones[mes] = {'columnas': columnas, 'indice': indice}
+        return self.particiones[mes]
+
+    def ingerir(self, escalas: Iterable[Dict]) -> Tuple[int, int]:
+        """Añade escalas nuevas y refresca las conocidas. Devuelve (nuevas, actualizadas)."""
+        nuevas = actualizadas = 0
+        for escala in escalas:
+            fecha = escala.get('fecha') or ''
+            if len(fecha) != 10:
+                continue  # Sin fecha no hay clave
+            mes = fecha[:7]
+            particion = self._particion(mes)
+            columnas = particion['columnas']
+            fila = {**escala, 'clave_barco': clave_escala(escala)}
+            clave = (fila['clave_barco'], fecha, fila.get('tipo'))
+
+            i = particion['indice'].get(clave)
+            if i is None:
+                particion['indice'][clave] = len(columnas['fecha'])
+                for c in COLUMNAS:
+                    columnas[c].append(fila.get(c))
+                nuevas += 1
+                self.modificadas.add(mes)
+                continue
+
+            cambio = False
+            for c in MUTABLES:
+                if fila.get(c) is not None and columnas[c][i] != fila[c]:
+                    columnas[c][i] = fila[c]
+                    cambio = True
+            if cambio:
+                actualizadas += 1
+                self.modificadas.add(mes)
+        return nuevas, actualizadas
+
+    def guardar(self) -> bool:
+        ok = True
+        for mes in sorted(self.modificadas):
+            success, message = safe_save_json(
+                filepath=self._ruta(mes),
+                data={'mes': mes, 'columnas': self.particiones[mes]['columnas']},
+                data_type='generic',
+                backup=False
+            )
+            if not success:
+                logger.error(message)
+                ok = False
+        self.modificadas.clear()
+        return ok
+
+    def consultar(self, desde: date, hasta: date) -> List[Dict]:
+        """Escalas con fecha en [desde, hasta], ordenadas por fecha y hora."""
+        d, h = desde.isoformat(), hasta.isoformat()
+        resultado = []
+        mes = date(desde.year, desde.month, 1)
+        while mes <= hasta:
+            columnas = self._particion(mes.strftime('%Y-%m'))['columnas']
+            # Filtro sobre una sola columna; las filas se montan solo para los aciertos
+            filas = [i for i, f in enumerate(columnas['fecha']) if d <= f <= h]
+            resultado.extend({c: columnas[c][i] for c in COLUMNAS} for i in filas)
+            mes = (mes + timedelta(days=32)).replace(day=1)
+        resultado.sort(key=lambda e: (e['fecha'], e.get('hora') or ''))
+        return resultado
+
+# =============================================================================
+# INGESTA DE BACKUPS (incremental)
+# =============================================================================
+def ingerir_backups(archivo: ArchivoCruceros) -> int:
+    """
+    Ingiere los backups de cruceros.json aún no procesados (orden de nombre =
+    orden temporal). El último ingerido queda en el estado del archivo.
+    """
+    ruta_estado = os.path.join(archivo.directorio, 'estado.json')
+    estado = load_existing_or_default(ruta_estado, default={}) or {}
+    ultimo = estado.get('ultimo_backup', '')
+
+    pendientes = [f for f in sorted(glob.glob(PATRON_BACKUPS)) if os.path.basename(f) > ultimo]
+    for ruta in pendientes:
+        datos = load_existing_or_default(ruta, default={}) or {}
+        archivo.ingerir(datos.get('llegadas', []) + datos.get('salidas', []))
+
+    if pendientes and archivo.guardar():
+        estado['ultimo_backup'] = os.path.basename(pendientes[-1])
+        safe_save_json(filepath=ruta_estado, data=estado, data_type='generic', backup=False)
+    return len(pendientes)
+
+# =============================================================================
+# CALENDARIO SEMANAL
+# =============================================================================
+def calendario(archivo: ArchivoCruceros, desde: Optional[date] = None, dias: int = 7) -> Dict:
+    """Escalas de [desde, desde + dias) agrupadas por día, con totales."""
+    desde = desde or hoy_local()
+    hasta = desde + timedelta(days=dias - 1)
+    por_dia = {(desde + timedelta(days=i)).isoformat(): [] for i in range(dias)}
+    for e in archivo.consultar(desde, hasta):
+        por_dia[e['fecha']].append({
+            "hora": e.get('hora'),
+            "tipo": e.get('tipo'),
+            "nombre": e.get('nombre'),
+            "terminal": e.get('terminal'),
+            "pax_estimados": e.get('pax_estimados') or 0,
+            "estado": e.get('estado'),
+        })
+
+    return {
+        "desde": desde.isoformat(),
+        "hasta": hasta.isoformat(),
+        "dias": [
+            {
+                "fecha": fecha,
+                "llegadas": sum(1 for e in escalas if e['tipo'] == 'llegada'),
+                "salidas": sum(1 for e in escalas if e['tipo'] == 'salida'),
+                "pax_estimados": sum(e['pax_estimados'] for e in escalas if e['tipo'] == 'llegada'),
+                "escalas": escalas,
+            }
+            for fecha, escalas in por_dia.items()
+        ],
+        "actualizado": ahora_local().isoformat(timespec='seconds'),
+    }
+
+def publicar_calendario(archivo: ArchivoCruceros):
+    semana = calendario(archivo)
+    success, message = safe_save_json(filepath=ARCHIVO_SEMANA, data=semana, data_type='generic', backup=False)
+    if success:
+        logger.info(f"📅 {message}")
+    else:
+        logger.error(message)
+
+# =============================================================================
+# API PARA EL SCRAPER
+# =============================================================================
+def archivar_escalas(escalas: List[Dict]):
+    """Ingesta de una ejecución + calendario. Un fallo aquí nunca debe tumbar al scraper."""
+    try:
+        archivo = ArchivoCruceros()
+        nuevas, actualizadas = archivo.ingerir(escalas)
+        archivo.guardar()
+        logger.info(f"🗄️ Archivo de escalas: {nuevas} nuevas, {actualizadas} actualizadas")
+        publicar_calendario(archivo)
+    except Exception as e:
+        logger.error(f"❌ Error archivando escalas: {e}")
+
+# =============================================================================
+# EJECUCIÓN
+# =============================================================================
+if __name__ == "__main__":
+    archivo = ArchivoCruceros()
+    n = ingerir_backups(archivo)
+    logger.info(f"🗄️ {n} backups ingeridos")
+    publicar_calendario(archivo)
+    sys.exit(0)
@@ -9,19 +9,34 @@ Frecuencia: Cada hora
 
 import sys
 import os
+import re
+import hashlib
 import requests
 import csv
-from io import StringIO
-from datetime import datetime
-from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Iterator, List, Dict, Optional, Tuple
 
 # --- IMPORTS ROBUSTEZ ---
-from utils import safe_save_json, setup_logger
+from utils import safe_save_json, setup_logger, load_existing_or_default
+from alertas import alertas_cruceros
+from cruceros_archivo import archivar_escalas
 from config import OUTPUT_FILES, LIMITS, URLS, TIMEOUTS
 
 # --- LOGGER ---
 logger = setup_logger('Cruceros_Scraper')
 
+# Validadores HTTP (ETag / Last-Modified) y registros ya parseados por URL
+ARCHIVO_CACHE = str(OUTPUT_FILES.get('cruceros_cache', 'cruceros_cache.json'))
+# Clasificación y atributos estáticos por barco (IMO/MMSI)
+ARCHIVO_BARCOS = str(OUTPUT_FILES.get('barcos_cache', 'barcos_cache.json'))
+
+# URLs del Open Data
+URL_LLEGADAS = URLS.get('cruceros_llegadas',
+    'https://opendata.portdebarcelona.cat/dataset/342fe09b-017b-4019-a743-ee773f09befd/resource/72f0fc9e-b4b4-4a61-a0fb-e7b65b601b4d/download/arribadesavui.csv')
+URL_SALIDAS = URLS.get('cruceros_salidas',
+    'https://opendata.portdebarcelona.cat/dataset/342fe09b-017b-4019-a743-ee773f09befd/resource/4bf1ccd0-5132-4d54-81d4-1ab72d5542e9/download/sortidesavui.csv')
+
 # =============================================================================
 # CONSTANTS
 # =============================================================================
@@ -34,6 +49,22 @@ CRUISE_TYPES = [
     "PASSENGER",        # Barco de pasajeros genérico
 ]
 
+# Nombres típicos de cruceros/ferries
+CRUISE_KEYWORDS = ['CRUISE', 'CRUISER', 'WONDER', 'HARMONY', 'OASIS',
+                   'SYMPHONY', 'ALLURE', 'NAVIGATOR', 'EXPLORER',
+                   'FERRY', 'TRASMEDITERRANEA', 'BALEARIA', 'GRIMALDI',
+                   'GNV', 'COSTA', 'MSC', 'ROYAL', 'NORWEGIAN', 'CARNIVAL',
+                   'CELEBRITY', 'DISNEY', 'PRINCESS', 'AIDA', 'TUI', 'MEIN SCHIFF']
+
+# Un matcher compilado por regla (en vez de un bucle de subcadenas por fila)
+RE_TIPO_CRUCERO = re.compile("|".join(map(re.escape, CRUISE_TYPES)))
+RE_NOMBRE_CRUCERO = re.compile("|".join(map(re.escape, CRUISE_KEYWORDS)))
+RE_CARGUERO = re.compile("CONTAINER|CARGO")
+# Si cambian las reglas, las clasificaciones cacheadas dejan de valer
+FIRMA_REGLAS = hashlib.md5(
+    "|".join(p.pattern for p in (RE_TIPO_CRUCERO, RE_NOMBRE_CRUCERO, RE_CARGUERO)).encode()
+).hexdigest()[:8]
+
 # Terminales de cruceros en Barcelona
 CRUISE_TERMINALS = {
     "A": "Terminal A (WTC)",
@@ -65,60 +96,151 @@ def estimate_passengers(eslora: float) -> int:
 # =============================================================================
 # DATA FETCHING
 # =============================================================================
-def fetch_csv_data(url: str) -> Optional[List[Dict]]:
+def crear_sesion() -> requests.Session:
+    """Sesión con pool de conexiones: las dos descargas reutilizan TLS/keep-alive."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def fetch_csv_data(url: str, session: requests.Session, validadores: Optional[Dict] = None) -> Tuple[Optional[Iterator[Dict]], Dict]:
     """
-    Descarga y parsea CSV desde la API del Port de Barcelona.
+    GET condicional en streaming contra la API del Port de Barcelona.
+
+    Returns:
+        (filas, validadores). Filas: generador que va leyendo el CSV según
+        llega (None si 304); validadores con 'no_modificado' = True si el
+        servidor respondió 304. Los errores HTTP se propagan.
     """
-    try:
-        response = requests.get(url, timeout=TIMEOUTS.get('api_request', 60))
-        response.raise_for_status()
-        response.encoding = 'utf-8'
+    cabeceras = {}
+    if validadores and validadores.get('etag'):
+        cabeceras['If-None-Match'] = validadores['etag']
+    if validadores and validadores.get('last_modified'):
+        cabeceras['If-Modified-Since'] = validadores['last_modified']
+
+    response = session.get(url, headers=cabeceras, stream=True, timeout=TIMEOUTS.get('api_request', 60))
+    if response.status_code == 304:
+        response.close()
+        return None, {**(validadores or {}), 'no_modificado': True}
+    response.raise_for_status()
+    response.encoding = 'utf-8'
+
+    nuevos = {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+    }
+    return leer_csv(response), nuevos
 
-        reader = csv.DictReader(StringIO(response.text))
-        return list(reader)
-    except requests.RequestException as e:
-        logger.error(f"Error fetching {url}: {e}")
-        return None
-    except Exception as e:
-        logger.error(f"Error parsing CSV: {e}")
-        return None
+def leer_csv(response: requests.Response) -> Iterator[Dict]:
+    """Líneas decodificadas según llegan -> DictReader, sin materializar el cuerpo."""
+    try:
+        yield from csv.DictReader(response.iter_lines(decode_unicode=True))
+    finally:
+        response.close()
 
 def is_cruise_or_ferry(row: Dict) -> bool:
     """
     Determina si el barco es un crucero o ferry de pasajeros.
     """
     vessel_type = (row.get('VAIXELLTIPUS') or '').upper()
-    vessel_name = (row.get('VAIXELLNOM') or '').upper()
-
-    # Verificar por tipo de barco
-    for cruise_type in CRUISE_TYPES:
-        if cruise_type in vessel_type:
-            return True
-
-    # Nombres típicos de cruceros/ferries
-    cruise_keywords = ['CRUISE', 'CRUISER', 'WONDER', 'HARMONY', 'OASIS',
-                       'SYMPHONY', 'ALLURE', 'NAVIGATOR', 'EXPLORER',
-                       'FERRY', 'TRASMEDITERRANEA', 'BALEARIA', 'GRIMALDI',
-                       'GNV', 'COSTA', 'MSC', 'ROYAL', 'NORWEGIAN', 'CARNIVAL',
-                       'CELEBRITY', 'DISNEY', 'PRINCESS', 'AIDA', 'TUI', 'MEIN SCHIFF']
 
-    for keyword in cruise_keywords:
-        if keyword in vessel_name:
-            return True
+    # Verificar por tipo de barco o por nombre
+    if RE_TIPO_CRUCERO.search(vessel_type) or RE_NOMBRE_CRUCERO.search((row.get('VAIXELLNOM') or '').upper()):
+        return True
 
-    # Verificar por eslora (cruceros suelen ser >150m)
+    # Verificar por eslora (cruceros suelen ser >150m), que no sea carguero
     try:
-        eslora = float(row.get('ESLORA_METRES') or 0)
-        if eslora >= 150:
-            # Podría ser crucero, verificar que no sea carguero
-            if 'CONTAINER' not in vessel_type and 'CARGO' not in vessel_type:
-                return True
-    except:
-        pass
+        return float(row.get('ESLORA_METRES') or 0) >= 150 and not RE_CARGUERO.search(vessel_type)
+    except ValueError:
+        return False
 
-    return False
+def clave_barco(row: Dict) -> Optional[str]:
+    """
+    IMO (permanente) o, si falta, MMSI. Sin ninguno no se cachea.
+    Vale para filas del CSV (IMO/MMSI) y para escalas ya parseadas (imo/mmsi).
+    """
+    imo = str(row.get('IMO') or row.get('imo') or '').strip()
+    if imo and imo != '0':
+        return f"IMO:{imo}"
+    mmsi = str(row.get('MMSI') or row.get('mmsi') or '').strip()
+    if mmsi and mmsi != '0':
+        return f"MMSI:{mmsi}"
+    return None
+
+class CacheBarcos:
+    """
+    Cache por barco (IMO/MMSI): clasificación y atributos estáticos.
+    Los mismos barcos hacen escala semana tras semana; solo los no vistos (o
+    con otro nombre: un MMSI puede reasignarse) pasan por las reglas. Las
+    entradas no vistas en `ttl_dias` se descartan al cargar.
+    """
 
-def parse_cruise_row(row: Dict, is_arrival: bool = True) -> Dict:
+    def __init__(self, filepath: str, ttl_dias: float):
+        self.filepath = filepath
+        self.ttl_dias = ttl_dias
+        self.barcos: Dict[str, dict] = {}
+        self.hoy = date.today().isoformat()
+        self.modificado = False
+        self._cargar()
+
+    def _cargar(self):
+        datos = load_existing_or_default(self.filepath, default={}) or {}
+        limite = (date.today() - timedelta(days=self.ttl_dias)).isoformat()
+        for clave, barco in datos.items():
+            if barco.get('visto', '') >= limite:
+                self.barcos[clave] = barco
+        self.modificado = len(self.barcos) != len(datos)
+
+    def es_crucero(self, row: Dict) -> bool:
+        clave = clave_barco(row)
+        if clave is None:
+            return is_cruise_or_ferry(row)
+
+        nombre = row.get('VAIXELLNOM') or ''
+        barco = self.barcos.get(clave)
+        hoy = self.hoy
+        if barco is None or barco.get('nombre') != nombre or barco.get('reglas') != FIRMA_REGLAS:
+            try:
+                eslora = float(row.get('ESLORA_METRES') or 0)
+            except ValueError:
+                eslora = 0
+            barco = {
+                'crucero': is_cruise_or_ferry(row),
+                'nombre': nombre,
+                'tipo': row.get('VAIXELLTIPUS', ''),
+                'eslora': eslora,
+                'bandera': row.get('VAIXELLBANDERANOM', ''),
+                'visto': hoy,
+                'reglas': FIRMA_REGLAS,
+            }
+            # Escrituras de dict atómicas: las dos descargas pueden compartir la cache
+            self.barcos[clave] = barco
+            self.modificado = True
+        elif barco.get('visto') != hoy:
+            barco['visto'] = hoy
+            self.modificado = True
+        return barco['crucero']
+
+    def eslora(self, row: Dict) -> float:
+        """Eslora del CSV o, si viene vacía, la ya conocida del barco."""
+        try:
+            eslora = float(row.get('ESLORA_METRES') or 0)
+        except ValueError:
+            eslora = 0
+        if not eslora:
+            eslora = self.barcos.get(clave_barco(row) or '', {}).get('eslora', 0)
+        return eslora
+
+    def persistir(self):
+        if not self.modificado:
+            return
+        success, message = safe_save_json(filepath=self.filepath, data=self.barcos, data_type='generic', backup=False)
+        if not success:
+            logger.warning(f"⚠️ No se pudo guardar la cache de barcos: {message}")
+        self.modificado = False
+
+def parse_cruise_row(row: Dict, is_arrival: bool = True, barcos: Optional[CacheBarcos] = None) -> Dict:
     """
     Parsea una fila del CSV a nuestro formato de crucero.
     """
@@ -135,10 +257,13 @@ def parse_cruise_row(row: Dict, is_arrival: bool = True) -> Dict:
         hora = hora[:5] if len(hora) >= 5 else hora
 
     # Extraer eslora y estimar pasajeros
-    try:
-        eslora = float(row.get('ESLORA_METRES') or 0)
-    except:
-        eslora = 0
+    if barcos is not None:
+        eslora = barcos.eslora(row)
+    else:
+        try:
+            eslora = float(row.get('ESLORA_METRES') or 0)
+        except:
+            eslora = 0
 
     pax = estimate_passengers(eslora)
 
@@ -174,50 +299,85 @@ def parse_cruise_row(row: Dict, is_arrival: bool = True) -> Dict:
         "fecha": fecha,
     }
 
+def cruceros_csv(filas: Iterator[Dict], is_arrival: bool, barcos: Optional[CacheBarcos] = None) -> Iterator[Dict]:
+    """Clasifica cada fila según llega y solo deja pasar cruceros/ferries ya parseados."""
+    es_crucero = barcos.es_crucero if barcos is not None else is_cruise_or_ferry
+    for row in filas:
+        if es_crucero(row):
+            yield parse_cruise_row(row, is_arrival=is_arrival, barcos=barcos)
+
+def descargar_cruceros(url: str, session: requests.Session, validadores: Optional[Dict], is_arrival: bool,
+                       barcos: Optional[CacheBarcos] = None) -> Tuple[Optional[List[Dict]], Dict]:
+    """
+    Descarga y parseo en el mismo hilo: el parseo se solapa con la descarga y
+    en memoria solo quedan los cruceros/ferries.
+
+    Returns:
+        (registros, validadores). (None, {'no_modificado': True, ...}) si 304;
+        (None, {}) si falla la descarga o el CSV.
+    """
+    try:
+        filas, nuevos = fetch_csv_data(url, session, validadores)
+        if filas is None:
+            return None, nuevos
+        return list(cruceros_csv(filas, is_arrival, barcos)), nuevos
+    except requests.RequestException as e:
+        logger.error(f"Error fetching {url}: {e}")
+        return None, {}
+    except Exception as e:
+        logger.error(f"Error parsing CSV: {e}")
+        return None, {}
+
 # =============================================================================
 # MAIN SCRAPER
 # =============================================================================
-def obtener_cruceros() -> Dict:
+def obtener_cruceros(cache: Dict, barcos: Optional[CacheBarcos] = None) -> Optional[Dict]:
     """
     Obtiene todos los cruceros del día desde el Open Data del Port de Barcelona.
 
+    Args:
+        cache: Validadores y registros por URL (se actualiza in-place)
+        barcos: Cache de clasificación por IMO/MMSI
+
     Returns:
-        Dict con llegadas, salidas, resumen y metadata
+        Dict con llegadas, salidas, resumen y metadata; None si ningún CSV ha cambiado
     """
     logger.info("🚢 Iniciando scraping de cruceros...")
 
-    # URLs del Open Data
-    url_arrivals = URLS.get('cruceros_llegadas',
-        'https://opendata.portdebarcelona.cat/dataset/342fe09b-017b-4019-a743-ee773f09befd/resource/72f0fc9e-b4b4-4a61-a0fb-e7b65b601b4d/download/arribadesavui.csv')
-    url_departures = URLS.get('cruceros_salidas',
-        'https://opendata.portdebarcelona.cat/dataset/342fe09b-017b-4019-a743-ee773f09befd/resource/4bf1ccd0-5132-4d54-81d4-1ab72d5542e9/download/sortidesavui.csv')
-
-    llegadas = []
-    salidas = []
-
-    # Fetch arrivals
-    logger.info("📥 Descargando llegadas...")
-    arrivals_data = fetch_csv_data(url_arrivals)
-    if arrivals_data:
-        for row in arrivals_data:
-            if is_cruise_or_ferry(row):
-                cruise = parse_cruise_row(row, is_arrival=True)
-                llegadas.append(cruise)
-        logger.info(f"   ✅ {len(llegadas)} cruceros/ferries en llegadas")
-    else:
-        logger.warning("   ⚠️ No se pudieron obtener llegadas")
-
-    # Fetch departures
-    logger.info("📤 Descargando salidas...")
-    departures_data = fetch_csv_data(url_departures)
-    if departures_data:
-        for row in departures_data:
-            if is_cruise_or_ferry(row):
-                cruise = parse_cruise_row(row, is_arrival=False)
-                salidas.append(cruise)
-        logger.info(f"   ✅ {len(salidas)} cruceros/ferries en salidas")
-    else:
-        logger.warning("   ⚠️ No se pudieron obtener salidas")
+    # Ambas descargas a la vez, con validadores de la ejecución anterior
+    fuentes = {'llegadas': (URL_LLEGADAS, True), 'salidas': (URL_SALIDAS, False)}
+    session = crear_sesion()
+    logger.info("📥 Descargando llegadas y salidas...")
+    with ThreadPoolExecutor(max_workers=len(fuentes)) as pool:
+        futuros = {
+            clave: pool.submit(descargar_cruceros, url, session, cache.get(url, {}).get('validadores'), is_arrival, barcos)
+            for clave, (url, is_arrival) in fuentes.items()
+        }
+        respuestas = {clave: futuro.result() for clave, futuro in futuros.items()}
+    session.close()
+
+    # 304 en ambos CSV: nada que parsear ni escribir
+    if all(v.get('no_modificado') for _, v in respuestas.values()):
+        logger.info("✅ CSV sin cambios (304). Nada que actualizar.")
+        return None
+
+    registros = {}
+    for clave, (url, _) in fuentes.items():
+        parseados, validadores = respuestas[clave]
+        if validadores.get('no_modificado'):
+            registros[clave] = cache[url].get('registros', [])
+            logger.info(f"   ♻️ {len(registros[clave])} cruceros/ferries en {clave} (sin cambios)")
+        elif parseados is not None:
+            registros[clave] = parseados
+            cache[url] = {'validadores': validadores, 'registros': parseados}
+            logger.info(f"   ✅ {len(registros[clave])} cruceros/ferries en {clave}")
+        else:
+            registros[clave] = []
+            cache.pop(url, None)  # Sin validadores: la próxima vez, descarga completa
+            logger.warning(f"   ⚠️ No se pudieron obtener {clave}")
+
+    llegadas = registros['llegadas']
+    salidas = registros['salidas']
 
     # Ordenar por hora
     llegadas.sort(key=lambda x: x['hora'])
@@ -269,8 +429,47 @@ def obtener_cruceros() -> Dict:
 # =============================================================================
 # EJECUCIÓN
 # =============================================================================
+def obtener_programacion(cache: Dict, barcos: Optional[CacheBarcos] = None) -> List[Dict]:
+    """
+    Escalas futuras del CSV de programación (URLS['cruceros_programacion'])
+    si el Port lo publica. Solo alimentan el archivo y el calendario semanal.
+    [] si no hay URL, si no ha cambiado (304) o si falla.
+    """
+    url = URLS.get('cruceros_programacion')
+    if not url:
+        return []
+    logger.info("📅 Descargando programación...")
+    session = crear_sesion()
+    registros, validadores = descargar_cruceros(url, session, cache.get(url, {}).get('validadores'), True, barcos)
+    session.close()
+    if registros is None:
+        return []
+    # Sin registros en la cache: ya quedan en el archivo
+    cache[url] = {'validadores': validadores}
+    logger.info(f"   ✅ {len(registros)} escalas programadas")
+    return registros
+
+def guardar_cache(cache: Dict):
+    success, message = safe_save_json(filepath=ARCHIVO_CACHE, data=cache, data_type='generic', backup=False)
+    if not success:
+        logger.warning(f"⚠️ Cache de cruceros no guardada: {message}")
+
 if __name__ == "__main__":
-    cruceros_data = obtener_cruceros()
+    cache = load_existing_or_default(ARCHIVO_CACHE, default={}) or {}
+    barcos = CacheBarcos(ARCHIVO_BARCOS, ttl_dias=LIMITS.get('vessel_cache_ttl_days', 365))
+    cruceros_data = obtener_cruceros(cache, barcos)
+    programacion = obtener_programacion(cache, barcos)
+    barcos.persistir()
+
+    if cruceros_data is None:
+        # CSV sin cambios, pero la ventana de las alertas avanza con el reloj:
+        # se evalúan sobre las llegadas de la cache (sin parsear ni escribir)
+        alertas_cruceros(str(OUTPUT_FILES.get('cruceros', 'public/cruceros.json')),
+                         {'llegadas': cache.get(URL_LLEGADAS, {}).get('registros', [])})
+        if programacion:
+            archivar_escalas(programacion)
+            guardar_cache(cache)
+        sys.exit(0)
 
     if cruceros_data and (cruceros_data['llegadas'] or cruceros_data['salidas']):
         # Usar safe_save_json para validar antes de sobrescribir
@@ -288,6 +487,10 @@ if __name__ == "__main__":
             logger.info(f"💾 {message}")
             logger.info(f"📊 Resumen: {cruceros_data['resumen']['total_cruceros']} cruceros, "
                        f"~{cruceros_data['resumen']['pax_estimados_hoy']:,} pasajeros estimados")
+            alertas_cruceros(archivo, cruceros_data)
+            archivar_escalas(programacion + cruceros_data['llegadas'] + cruceros_data['salidas'])
+            # Validadores solo tras escribir: si el guardado falla, la próxima vez se descarga todo
+            guardar_cache(cache)
         else:
             logger.error(message)
             sys.exit(1)
@@ -314,3 +517,5 @@ if __name__ == "__main__":
         }
         archivo = str(OUTPUT_FILES.get('cruceros', 'public/cruceros.json'))
         safe_save_json(filepath=archivo, data=empty_data, data_type='generic', backup=False)
+        if programacion:
+            archivar_escalas(programacion)
@@ -1,6 +1,5 @@
 import sys
 import os
-import time
 import re
 import json
 import requests # Necesario para ScraperAPI
@@ -13,10 +12,6 @@ if 'google.colab' in sys.modules:
     print("🛠️ Entorno Colab detectado...")
     # (Instalaciones de Colab omitidas para ahorrar espacio, déjalas si las usas)
 
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
@@ -24,20 +19,14 @@ from selenium.webdriver.support import expected_conditions as EC
 # --- IMPORTS ROBUSTEZ ---
 from utils import safe_save_json, setup_logger
 from config import OUTPUT_FILES, LIMITS
+from browser_utils import crear_driver, aplicar_bloqueo_red, esperar_pagina_lista, esperar_dom_estable, extraer_textos
 
 # --- LOGGER ---
 logger = setup_logger('Licencia_Scraper')
 
 def iniciar_driver():
     # Configuración estándar de Selenium (ya no necesitamos trucos de móvil ni stealth)
-    options = Options()
-    options.add_argument('--headless=new') 
-    options.add_argument('--no-sandbox')
-    options.add_argument('--disable-dev-shm-usage')
-    options.add_argument('--window-size=1920,1080')
-    options.add_argument("--lang=es-ES")
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-    return driver
+    return crear_driver('default', headless_arg='--headless=new', extra_args=["--lang=es-ES"])
 
 # =============================================================================
 # 2. MOTORES DE EXTRACCIÓN
@@ -100,8 +89,9 @@ def scrape_solano(driver):
     datos = []
     print(f"\n🌍 [2/4] SOLANO...")
     try:
+        aplicar_bloqueo_red(driver, 'solano')
         driver.get("https://asesoriasolano.es/comprar-licencias/")
-        time.sleep(4)
+        esperar_pagina_lista(driver)
         full_text = driver.find_element(By.TAG_NAME, "body").text
         
         # Patrón Ref -> Interesado
@@ -126,13 +116,14 @@ def scrape_garcia(driver):
     datos = []
     print(f"\n🌍 [3/4] GARCÍA BCN...")
     try:
+        aplicar_bloqueo_red(driver, 'garcia_bcn')
         driver.get("https://asesoriagarciabcn.com/compra-y-venta-de-licencias-de-taxi-en-barcelona/")
-        time.sleep(4)
+        esperar_pagina_lista(driver)
         driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(2)
-        items = driver.find_elements(By.TAG_NAME, "li") + driver.find_elements(By.TAG_NAME, "p")
+        esperar_dom_estable(driver)
+        items = extraer_textos(driver, ["li", "p"])
         for item in items:
-            texto = item.text
+            texto = item['texto']
             if "€" in texto and len(texto) > 20:
                 datos.append({"fuente": "GARCIA_BCN", "raw": texto.replace("\n", " | ")})
     except: pass
@@ -144,12 +135,13 @@ def scrape_stac(driver):
     datos = []
     print(f"\n🌍 [4/4] STAC...")
     try:
+        aplicar_bloqueo_red(driver, 'stac')
         driver.get("https://bolsadelicenciasstac.cat")
-        time.sleep(5)
-        articles = driver.find_elements(By.TAG_NAME, "article")
+        esperar_pagina_lista(driver)
+        articles = extraer_textos(driver, ["article"])
         if len(articles) > 0:
             for art in articles:
-                texto = art.text
+                texto = art['texto']
                 if "Precio" in texto or "€" in texto:
                     datos.append({"fuente": "STAC", "raw": texto.replace("\n", " | ")})
         else:
@@ -15,7 +15,6 @@ Mejoras:
 
 import sys
 import os
-import time
 import re
 import json
 import hashlib
@@ -28,17 +27,18 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Selenium imports
 from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 
 # Local imports
-from utils import safe_save_json, setup_logger, retry_with_backoff
+from utils import safe_save_json, setup_logger, retry_with_backoff, load_existing_or_default
 from config import OUTPUT_FILES, LIMITS, TIMEOUTS
+from browser_utils import (
+    crear_driver, aplicar_bloqueo_red, esperar_pagina_lista, esperar_documento,
+    esperar_dom_estable, esperar_crecimiento_filas, extraer_textos
+)
 
 # --- LOGGER ---
 logger = setup_logger('Licencia_Scraper_V2')
@@ -76,35 +76,15 @@ class OfertaRaw:
 # =============================================================================
 def iniciar_driver(headless: bool = True) -> webdriver.Chrome:
     """Inicia driver de Chrome con configuración optimizada"""
-    options = Options()
-    if headless:
-        options.add_argument('--headless=new')
-    options.add_argument('--no-sandbox')
-    options.add_argument('--disable-dev-shm-usage')
-    options.add_argument('--window-size=1920,1080')
-    options.add_argument('--lang=es-ES')
-    options.add_argument('--disable-blink-features=AutomationControlled')
-    options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-
-    # Evitar detección de Selenium
-    options.add_experimental_option('excludeSwitches', ['enable-automation'])
-    options.add_experimental_option('useAutomationExtension', False)
-
-    driver = webdriver.Chrome(
-        service=Service(ChromeDriverManager().install()),
-        options=options
+    # Stealth + blocklist de red; cada scraper ajusta la blocklist a su sitio
+    return crear_driver(
+        'default',
+        headless=headless,
+        headless_arg='--headless=new',
+        stealth=True,
+        extra_args=['--lang=es-ES']
     )
 
-    # Ejecutar script para ocultar webdriver
-    driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
-        'source': '''
-            Object.defineProperty(navigator, 'webdriver', {get: () => undefined});
-            Object.defineProperty(navigator, 'plugins', {get: () => [1, 2, 3, 4, 5]});
-        '''
-    })
-
-    return driver
-
 def extraer_precio_texto(texto: str) -> Optional[int]:
     """Extrae precio de un texto con múltiples patrones"""
     texto_clean = texto.replace('\n', ' ').upper().replace('.', '').replace(',', '')
@@ -222,6 +202,85 @@ def extraer_referencia(texto: str, fuente: str) -> str:
     # Generar hash del contenido como fallback
     return hashlib.md5(texto.encode()).hexdigest()[:8]
 
+# =============================================================================
+# CACHE DE HUELLAS (páginas de listado sin cambios)
+# =============================================================================
+def huella_pagina(texto: str) -> str:
+    """Hash del texto visible normalizado (espacios colapsados)"""
+    normalizado = re.sub(r'\s+', ' ', texto or '').strip()
+    return hashlib.sha256(normalizado.encode('utf-8')).hexdigest()[:16]
+
+class CacheHuellas:
+    """
+    Cache por fuente: huella de la página -> ofertas ya extraídas.
+    Si la huella coincide (y no ha caducado) se reutilizan las ofertas sin
+    volver a parsear ni abrir detalles. Se guarda junto al output raw.
+    """
+
+    def __init__(self, filepath: str, ttl_horas: float):
+        self.filepath = filepath
+        self.ttl_horas = ttl_horas
+        self.entradas: Dict[str, dict] = {}
+        self.modificado = False  # Solo se reescribe el fichero si algo cambió
+        self._cargar()
+
+    def _cargar(self):
+        datos = load_existing_or_default(self.filepath, default={}) or {}
+        ahora = datetime.now()
+        for fuente, entrada in datos.items():
+            try:
+                edad = ahora - datetime.fromisoformat(entrada['guardado'])
+                if edad.total_seconds() < self.ttl_horas * 3600:
+                    self.entradas[fuente] = entrada
+                    continue
+            except (KeyError, TypeError, ValueError):
+                pass
+            self.modificado = True  # Entrada caducada o corrupta: se poda al persistir
+
+    def obtener(self, fuente: str, huella: str) -> Optional[List[OfertaRaw]]:
+        """Ofertas cacheadas si la huella coincide, None si no"""
+        entrada = self.entradas.get(fuente)
+        if not entrada or entrada.get('huella') != huella:
+            return None
+        ahora = datetime.now().isoformat()
+        return [OfertaRaw(**{**o, 'fecha_scraping': ahora}) for o in entrada.get('ofertas', [])]
+
+    def guardar(self, fuente: str, huella: str, ofertas: List[OfertaRaw]):
+        # Sin ofertas no cacheamos: probablemente la página no cargó bien
+        if not ofertas:
+            return
+        self.entradas[fuente] = {
+            'huella': huella,
+            'guardado': datetime.now().isoformat(),
+            'ofertas': [o.to_dict() for o in ofertas],
+        }
+        self.modificado = True
+
+    def persistir(self):
+        if not self.modificado:
+            return
+        # force solo si quedó vacía (todo caducado): safe_save_json rechaza dicts vacíos
+        success, message = safe_save_json(
+            filepath=self.filepath,
+            data=self.entradas,
+            data_type='generic',
+            backup=False,
+            force=not self.entradas
+        )
+        if success:
+            self.modificado = False
+        else:
+            logger.warning(f"⚠️ No se pudo guardar la cache de huellas: {message}")
+
+def consultar_cache(cache: Optional[CacheHuellas], fuente: str, huella: str) -> Optional[List[OfertaRaw]]:
+    """Atajo: devuelve ofertas cacheadas (y lo loguea) o None"""
+    if cache is None:
+        return None
+    ofertas = cache.obtener(fuente, huella)
+    if ofertas is not None:
+        logger.info(f"   ♻️ Página sin cambios (huella {huella}): {len(ofertas)} ofertas de cache")
+    return ofertas
+
 # =============================================================================
 # SCRAPERS INDIVIDUALES
 # =============================================================================
@@ -309,27 +368,28 @@ def scrape_milanuncios_selenium(driver: webdriver.Chrome) -> List[OfertaRaw]:
     logger.info("🌍 [MILANUNCIOS-SELENIUM] Intentando fallback...")
 
     try:
+        aplicar_bloqueo_red(driver, 'milanuncios')
         driver.get("https://www.milanuncios.com/anuncios/?s=Licencia%20taxi%20barcelona")
-        time.sleep(5)
+        esperar_crecimiento_filas(driver, "article", 0)
 
         # Aceptar cookies si aparece
         try:
             cookie_btn = driver.find_element(By.ID, "didomi-notice-agree-button")
             cookie_btn.click()
-            time.sleep(1)
+            esperar_dom_estable(driver, timeout=2)
         except:
             pass
 
         # Scroll para cargar más
         for _ in range(3):
             driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(2)
+            esperar_dom_estable(driver)
 
-        anuncios = driver.find_elements(By.TAG_NAME, "article")
+        anuncios = extraer_textos(driver, ["article"])
 
         for anuncio in anuncios:
             try:
-                texto = anuncio.text
+                texto = anuncio['texto']
                 if len(texto) < 30:
                     continue
 
@@ -356,21 +416,28 @@ def scrape_milanuncios_selenium(driver: webdriver.Chrome) -> List[OfertaRaw]:
     logger.info(f"   ✅ {len(ofertas)} ofertas de MILANUNCIOS (Selenium)")
     return ofertas
 
-def scrape_solano(driver: webdriver.Chrome) -> List[OfertaRaw]:
+def scrape_solano(driver: webdriver.Chrome, cache: Optional[CacheHuellas] = None) -> List[OfertaRaw]:
     """Scrape Asesoría Solano - Fuente muy fiable"""
     ofertas = []
+    huella = None
     logger.info("🌍 [SOLANO] Iniciando scraping...")
 
     try:
+        aplicar_bloqueo_red(driver, 'solano')
         driver.get("https://asesoriasolano.es/comprar-licencias/")
-        time.sleep(4)
+        esperar_pagina_lista(driver)
 
         # Scroll completo
         driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(2)
+        esperar_dom_estable(driver)
 
         full_text = driver.find_element(By.TAG_NAME, "body").text
 
+        huella = huella_pagina(full_text)
+        cacheadas = consultar_cache(cache, "SOLANO", huella)
+        if cacheadas is not None:
+            return cacheadas
+
         # Patrón principal: Ref -> ESTOY INTERESADO
         patron = r"(Ref:.*?ESTOY INTERESADO)"
         matches = re.findall(patron, full_text, re.DOTALL | re.IGNORECASE)
@@ -409,33 +476,41 @@ def scrape_solano(driver: webdriver.Chrome) -> List[OfertaRaw]:
     except Exception as e:
         logger.error(f"   🔥 Error: {e}")
 
+    if cache is not None and huella:
+        cache.guardar("SOLANO", huella, ofertas)
+
     logger.info(f"   ✅ {len(ofertas)} ofertas de SOLANO")
     return ofertas
 
-def scrape_garcia_bcn(driver: webdriver.Chrome) -> List[OfertaRaw]:
+def scrape_garcia_bcn(driver: webdriver.Chrome, cache: Optional[CacheHuellas] = None) -> List[OfertaRaw]:
     """Scrape Asesoría García BCN - Actualizado"""
     ofertas = []
+    huella = None
     logger.info("🌍 [GARCIA BCN] Iniciando scraping...")
 
     try:
+        aplicar_bloqueo_red(driver, 'garcia_bcn')
         driver.get("https://asesoriagarciabcn.com/compra-y-venta-de-licencias-de-taxi-en-barcelona/")
-        time.sleep(5)
+        esperar_pagina_lista(driver)
 
         # Scroll completo para cargar todo
         for _ in range(3):
             driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(1.5)
+            esperar_dom_estable(driver)
+
+        huella = huella_pagina(driver.find_element(By.TAG_NAME, "body").text)
+        cacheadas = consultar_cache(cache, "GARCIA_BCN", huella)
+        if cacheadas is not None:
+            return cacheadas
 
-        # Buscar en múltiples selectores
-        elementos = []
-        for tag in ['article', 'div', 'li', 'p']:
-            elementos.extend(driver.find_elements(By.TAG_NAME, tag))
+        # Buscar en múltiples selectores (un único execute_script)
+        elementos = extraer_textos(driver, ['article', 'div', 'li', 'p'])
 
         textos_vistos = set()
 
         for elem in elementos:
             try:
-                texto = elem.text
+                texto = elem['texto']
                 if len(texto) < 30 or texto in textos_vistos:
                     continue
                 textos_vistos.add(texto)
@@ -464,28 +539,39 @@ def scrape_garcia_bcn(driver: webdriver.Chrome) -> List[OfertaRaw]:
     except Exception as e:
         logger.error(f"   🔥 Error: {e}")
 
+    if cache is not None and huella:
+        cache.guardar("GARCIA_BCN", huella, ofertas)
+
     logger.info(f"   ✅ {len(ofertas)} ofertas de GARCIA BCN")
     return ofertas
 
-def scrape_stac(driver: webdriver.Chrome) -> List[OfertaRaw]:
+def scrape_stac(driver: webdriver.Chrome, cache: Optional[CacheHuellas] = None) -> List[OfertaRaw]:
     """Scrape STAC (Bolsa de Licencias oficial) - Mejorado"""
     ofertas = []
+    huella = None
     logger.info("🌍 [STAC] Iniciando scraping...")
 
     try:
+        aplicar_bloqueo_red(driver, 'stac')
         driver.get("https://bolsadelicenciasstac.cat")
-        time.sleep(5)
+        esperar_pagina_lista(driver)
 
         # Scroll para cargar todo
         for _ in range(2):
             driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(2)
+            esperar_dom_estable(driver)
+
+        # Si el listado no cambió nos ahorramos también las pestañas de detalle
+        huella = huella_pagina(driver.find_element(By.TAG_NAME, "body").text)
+        cacheadas = consultar_cache(cache, "STAC", huella)
+        if cacheadas is not None:
+            return cacheadas
 
-        articles = driver.find_elements(By.TAG_NAME, "article")
+        articles = extraer_textos(driver, ["article"])
 
         for art in articles:
             try:
-                texto = art.text
+                texto = art['texto']
                 if "Precio" not in texto and "€" not in texto:
                     continue
 
@@ -496,13 +582,12 @@ def scrape_stac(driver: webdriver.Chrome) -> List[OfertaRaw]:
                 # Intentar obtener más detalles del enlace
                 dia_descanso = "NO ESPECIFICADO"
                 try:
-                    link = art.find_element(By.TAG_NAME, "a")
-                    href = link.get_attribute("href")
+                    href = art['href']
                     if href and "licencia" in href.lower():
                         # Abrir en nueva pestaña para obtener detalles
                         driver.execute_script("window.open(arguments[0], '_blank');", href)
                         driver.switch_to.window(driver.window_handles[-1])
-                        time.sleep(2)
+                        esperar_documento(driver)
 
                         detalle_texto = driver.find_element(By.TAG_NAME, "body").text
                         dia_descanso = extraer_dia_descanso(detalle_texto)
@@ -549,6 +634,9 @@ def scrape_stac(driver: webdriver.Chrome) -> List[OfertaRaw]:
     except Exception as e:
         logger.error(f"   🔥 Error: {e}")
 
+    if cache is not None and huella:
+        cache.guardar("STAC", huella, ofertas)
+
     logger.info(f"   ✅ {len(ofertas)} ofertas de STAC")
     return ofertas
 
@@ -702,6 +790,10 @@ def main():
     # 2. Fuentes con Selenium
     logger.info("\n🌐 FASE 2: Fuentes Selenium...")
     driver = None
+    cache = CacheHuellas(
+        str(OUTPUT_FILES.get('licencias_cache', 'licencias_cache.json')),
+        ttl_horas=LIMITS.get('license_cache_ttl_hours', 72)
+    )
 
     try:
         driver = iniciar_driver()
@@ -713,15 +805,15 @@ def main():
             todas_ofertas.extend(ofertas_milan_sel)
 
         # SOLANO (muy fiable)
-        ofertas_solano = scrape_solano(driver)
+        ofertas_solano = scrape_solano(driver, cache)
         todas_ofertas.extend(ofertas_solano)
 
         # GARCIA BCN
-        ofertas_garcia = scrape_garcia_bcn(driver)
+        ofertas_garcia = scrape_garcia_bcn(driver, cache)
         todas_ofertas.extend(ofertas_garcia)
 
         # STAC (oficial)
-        ofertas_stac = scrape_stac(driver)
+        ofertas_stac = scrape_stac(driver, cache)
         todas_ofertas.extend(ofertas_stac)
 
     except Exception as e:
@@ -729,6 +821,7 @@ def main():
     finally:
         if driver:
             driver.quit()
+        cache.persistir()
 
     # 3. Post-procesamiento
     logger.info("\n🔧 FASE 3: Post-procesamiento...")
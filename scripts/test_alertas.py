@@ -0,0 +1,106 @@
+"""
+=============================================================================
+TEST ALERTAS - Persistencia del motor entre ejecuciones
+=============================================================================
+Descripción: Cada scraper es un proceso nuevo: el motor evalúa, guarda el
+             estado en alertas_estado.json y la siguiente ejecución lo
+             recarga. Una alerta ya disparada no debe volver a dispararse
+             mientras su regla siga activa.
+
+Uso: python scripts/test_alertas.py
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from alertas import MotorAlertas, instantes_vuelos, fusionar_archivo, ALERTS
+
+AHORA = datetime(2026, 7, 1, 12, 0)
+
+def vuelos_pico():
+    """8 llegadas a T2C y 16 a T1 en los próximos 30 min: pico_t2c y pico_t1 activas."""
+    vuelos = []
+    for i in range(24):
+        hora = AHORA + timedelta(minutes=i)
+        vuelos.append({
+            'hora': hora.strftime('%H:%M'),
+            'dia_relativo': 0,
+            'terminal': 'T2C (EasyJet)' if i < 8 else 'T1',
+            'vuelo': f"VY{1000 + i}",
+        })
+    return vuelos
+
+class TestPersistenciaMotor(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.archivo_alertas = os.path.join(self.directorio, 'alertas.json')
+        self.archivo_estado = os.path.join(self.directorio, 'alertas_estado.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directorio, ignore_errors=True)
+
+    def motor(self):
+        return MotorAlertas(self.archivo_alertas, self.archivo_estado, ALERTS['reglas'])
+
+    def evaluar(self, motor, vuelos, ahora):
+        disparadas = motor.evaluar('vuelos', instantes_vuelos(vuelos, AHORA.date()), ahora)
+        motor.guardar()
+        return disparadas
+
+    def test_recarga_no_redispara(self):
+        vuelos = vuelos_pico()
+        primeras = self.evaluar(self.motor(), vuelos, AHORA)
+        self.assertEqual({a['regla'] for a in primeras}, {'pico_t2c', 'pico_t1'})
+
+        # Nueva ejecución (proceso nuevo): mismo feed, y después con el reloj avanzado
+        motor = self.motor()
+        self.assertEqual(self.evaluar(motor, vuelos, AHORA), [])
+        self.assertEqual(self.evaluar(self.motor(), vuelos, AHORA + timedelta(minutes=1)), [])
+
+    def test_recarga_conserva_totales(self):
+        vuelos = vuelos_pico()
+        self.evaluar(self.motor(), vuelos, AHORA)
+
+        motor = self.motor()
+        self.evaluar(motor, vuelos[1:], AHORA)
+        total_incremental = motor.estado['vuelos']['totales']
+
+        limpio = MotorAlertas(os.path.join(self.directorio, 'a2.json'),
+                              os.path.join(self.directorio, 'e2.json'), ALERTS['reglas'])
+        self.evaluar(limpio, vuelos[1:], AHORA)
+        self.assertEqual(total_incremental, limpio.estado['vuelos']['totales'])
+
+    def test_redispara_tras_desactivarse(self):
+        vuelos = vuelos_pico()
+        self.evaluar(self.motor(), vuelos, AHORA)
+        self.evaluar(self.motor(), [], AHORA)  # Ventana vacía: reglas inactivas
+        disparadas = self.evaluar(self.motor(), vuelos, AHORA)
+        self.assertEqual({a['regla'] for a in disparadas}, {'pico_t2c', 'pico_t1'})
+
+    def test_fusion_tras_conflicto(self):
+        # Dos ejecuciones parten del mismo estado: una evalúa vuelos y otra trenes
+        self.evaluar(self.motor(), [], AHORA)
+        despues = AHORA + timedelta(seconds=30)  # Mismo cubo que el estado de partida
+        ruta = lambda nombre: os.path.join(self.directorio, nombre)
+        shutil.copy(self.archivo_estado, ruta('estado_remoto.json'))
+        shutil.copy(self.archivo_estado, ruta('estado_local.json'))
+
+        remoto = MotorAlertas(ruta('alertas_remoto.json'), ruta('estado_remoto.json'), ALERTS['reglas'])
+        self.evaluar(remoto, vuelos_pico(), despues)
+        local = MotorAlertas(ruta('alertas_local.json'), ruta('estado_local.json'), ALERTS['reglas'])
+        local.evaluar('trenes_sants', [], despues)
+        local.guardar()
+
+        self.assertTrue(fusionar_archivo(self.archivo_estado, ruta('estado_local.json'), ruta('estado_remoto.json')))
+        self.assertTrue(fusionar_archivo(self.archivo_alertas, ruta('alertas_local.json'), ruta('alertas_remoto.json')))
+        motor = self.motor()
+        self.assertEqual(self.evaluar(motor, vuelos_pico(), despues), [])
+        self.assertEqual(set(motor.estado), {'vuelos', 'trenes_sants'})
+        self.assertEqual({a['regla'] for a in motor.alertas}, {'pico_t2c', 'pico_t1'})
+
+if __name__ == '__main__':
+    unittest.main()
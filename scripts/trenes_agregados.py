@@ -0,0 +1,132 @@
+"""
+=============================================================================
+TRENES AGREGADOS - Resumen por hora, ciudad de origen y operador
+=============================================================================
+Descripción: Etapa posterior a adif_scrap.py. Las vistas de trenes (día
+             completo, por ciudad, por operador) reagrupaban en el móvil la
+             lista entera de trenes_sants.json; aquí se precalculan esos
+             grupos con pasajeros estimados (trenes_demanda.py) y se
+             publica un JSON compacto (public/trenes_agregados.json).
+             La agrupación es vectorizada: cada tren es un timestamp entero
+             en minutos y los cubos salen de un único np.bincount por vista.
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# --- IMPORTS ROBUSTEZ ---
+from utils import safe_save_json, setup_logger, load_existing_or_default, ahora_local
+from config import OUTPUT_FILES
+from trenes_modelo import instante_tren
+from trenes_demanda import operador, estimar_pax
+
+# --- LOGGER ---
+logger = setup_logger('Trenes_Agregados')
+
+ARCHIVO_TRENES = str(OUTPUT_FILES.get('trenes_sants', 'trenes_sants.json'))
+ARCHIVO_AGREGADOS = str(OUTPUT_FILES.get('trenes_agregados', 'trenes_agregados.json'))
+EPOCA = datetime(2000, 1, 1)
+UN_MINUTO = timedelta(minutes=1)
+
+# =============================================================================
+# NORMALIZACIÓN (mismas reglas que getCiudad de las vistas)
+# =============================================================================
+CIUDADES = (
+    (("MADRID",), "Madrid"), (("SEVILLA",), "Sevilla"), (("MÁLAGA",), "Málaga"),
+    (("VALÈNCIA", "VALENCIA"), "València"), (("ALACANT", "ALICANTE"), "Alicante"),
+    (("FIGUERES",), "Figueres"), (("PARIS",), "París"), (("MARSEILLE",), "Marsella"),
+    (("DONOSTIA", "SAN SEBASTIÁN"), "Donostia"), (("ZARAGOZA",), "Zaragoza"),
+    (("GRANADA",), "Granada"), (("CÓRDOBA",), "Córdoba"),
+)
+
+def ciudad(nombre):
+    if not nombre:
+        return ""
+    mayus = nombre.upper()
+    for claves, ciudad_norm in CIUDADES:
+        if any(c in mayus for c in claves):
+            return ciudad_norm
+    return nombre.split(" ")[0].split("-")[0]
+
+# =============================================================================
+# AGREGACIÓN
+# =============================================================================
+def agrupar(claves, hora_idx, pax, n_horas):
+    """
+    Un bincount sobre el índice plano (grupo, hora) -> {grupo: totales y serie
+    por hora}, ordenado de más a menos trenes.
+    """
+    nombres, grupo_idx = np.unique(np.asarray(claves), return_inverse=True)
+    plano = grupo_idx * n_horas + hora_idx
+    tamano = len(nombres) * n_horas
+    trenes_h = np.bincount(plano, minlength=tamano).reshape(len(nombres), n_horas)
+    pax_h = np.bincount(plano, weights=pax, minlength=tamano).reshape(len(nombres), n_horas)
+    totales = trenes_h.sum(axis=1)
+
+    return {
+        str(nombres[g]): {
+            "trenes": int(totales[g]),
+            "pax": int(pax_h[g].sum()),
+            "por_hora": trenes_h[g].tolist(),
+        }
+        for g in np.argsort(-totales, kind='stable')
+    }
+
+def agregar(trenes, ahora=None):
+    """Lista de trenes (con fecha de servicio) -> feed compacto de agregados."""
+    ahora = ahora or ahora_local()
+    trenes = [t for t in trenes if 'fecha' in t and 'hora_programada' in t]
+    if not trenes:
+        return None
+
+    # Feeds anteriores al modelo de demanda: se estiman aquí
+    sin_pax = [t for t in trenes if t.get('pax_estimados') is None]
+    if sin_pax:
+        estimar_pax(sin_pax)
+
+    n = len(trenes)
+    minutos = np.fromiter(((instante_tren(t) - EPOCA) // UN_MINUTO for t in trenes), dtype=np.int64, count=n)
+    pax = np.fromiter((t['pax_estimados'] for t in trenes), dtype=np.int64, count=n)
+
+    horas = minutos // 60
+    hora_0 = int(horas.min())
+    hora_idx = horas - hora_0
+    n_horas = int(hora_idx.max()) + 1
+    inicio = EPOCA + timedelta(hours=hora_0)
+
+    return {
+        "actualizado": ahora.isoformat(timespec='seconds'),
+        "inicio": inicio.isoformat(timespec='minutes'),
+        "horas": [(inicio + timedelta(hours=h)).strftime('%H:00') for h in range(n_horas)],
+        "total": {"trenes": n, "pax": int(pax.sum())},
+        "por_hora": {
+            "trenes": np.bincount(hora_idx, minlength=n_horas).tolist(),
+            "pax": np.bincount(hora_idx, weights=pax, minlength=n_horas).astype(np.int64).tolist(),
+        },
+        "por_ciudad": agrupar([ciudad(t.get('origen') or t.get('destino')) for t in trenes], hora_idx, pax, n_horas),
+        "por_operador": agrupar([operador(t.get('tren')) for t in trenes], hora_idx, pax, n_horas),
+    }
+
+# =============================================================================
+# EJECUCIÓN
+# =============================================================================
+def main():
+    # Sin código de error: el workflow hace commit de trenes_*.json después de
+    # este paso y unos agregados fallidos no deben impedirlo
+    trenes = load_existing_or_default(ARCHIVO_TRENES, default=[]) or []
+    agregados = agregar(trenes)
+    if not agregados:
+        logger.warning("⚠️ Sin trenes con fecha de servicio. Agregados NO modificados.")
+        return
+
+    success, message = safe_save_json(
+        filepath=ARCHIVO_AGREGADOS, data=agregados, data_type='generic', backup=False
+    )
+    if success:
+        logger.info(f"💾 {message} | {agregados['total']['trenes']} trenes, ~{agregados['total']['pax']:,} pax")
+    else:
+        logger.warning(f"⚠️ {message}. Agregados NO modificados.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+=============================================================================
+TRENES DEMANDA - Pasajeros estimados por tren
+=============================================================================
+Descripción: Modelo de demanda de trenes a partir de la tabla de config.TRAINS
+             (plazas y composición por tipo de servicio, ocupación por franja
+             horaria). La tabla se expande una vez a una matriz servicio x hora
+             de pasajeros esperados; estimar un lote de trenes es un único
+             indexado numpy, barato en cada ejecución del scraper.
+"""
+
+import numpy as np
+
+from config import TRAINS
+
+# =============================================================================
+# TIPO DE SERVICIO (mismas reglas que getTipoTren de las vistas)
+# =============================================================================
+OPERADORES = (("IRYO", "IRYO"), ("IL -", "IRYO"), ("OUIGO", "OUIGO"), ("TGV", "TGV"), ("AVE", "AVE"))
+
+def operador(tren):
+    tipo = (tren or "").split("\n")[0].strip()
+    for clave, nombre in OPERADORES:
+        if clave in tipo:
+            return nombre
+    return tipo.split(" ")[0]
+
+# =============================================================================
+# TABLA SERVICIO x HORA
+# =============================================================================
+SERVICIOS = tuple(TRAINS['servicios'])
+INDICE_SERVICIO = {s: i for i, s in enumerate(SERVICIOS)}
+SERVICIO_DEFECTO = len(SERVICIOS)  # Última fila: servicio no catalogado
+
+def franja(hora):
+    nombre = TRAINS['franjas'][0][1]
+    for inicio, franja_nombre in TRAINS['franjas']:
+        if hora >= inicio:
+            nombre = franja_nombre
+    return nombre
+
+def unidades(servicio, nombre_franja):
+    u = servicio.get('unidades', 1)
+    return u.get(nombre_franja, u.get('defecto', 1)) if isinstance(u, dict) else u
+
+def construir_tabla():
+    """Matriz (servicios + defecto) x 24 horas con los pasajeros esperados por tren."""
+    filas = [(s, TRAINS['servicios'][s]) for s in SERVICIOS] + [(None, TRAINS['servicio_defecto'])]
+    tabla = np.zeros((len(filas), 24))
+    for i, (nombre, servicio) in enumerate(filas):
+        factor = TRAINS.get('factor_servicio', {}).get(nombre, 1.0)
+        for hora in range(24):
+            f = franja(hora)
+            capacidad = servicio['plazas'] * unidades(servicio, f)
+            tabla[i, hora] = capacidad * min(1.0, TRAINS['ocupacion'][f] * factor)
+    return np.rint(tabla).astype(np.int64)
+
+PAX_SERVICIO_HORA = construir_tabla()
+
+# =============================================================================
+# ESTIMACIÓN
+# =============================================================================
+def _hora(t):
+    try:
+        return int(t.get('hora', '')[:2]) % 24
+    except ValueError:
+        return 0
+
+def estimar_pax(trenes):
+    """Añade `pax_estimados` a cada tren (in-place) y devuelve el array de pasajeros."""
+    n = len(trenes)
+    if not n:
+        return np.zeros(0, dtype=np.int64)
+    servicio = np.fromiter(
+        (INDICE_SERVICIO.get(operador(t.get('tren')), SERVICIO_DEFECTO) for t in trenes),
+        dtype=np.int64, count=n
+    )
+    hora = np.fromiter((_hora(t) for t in trenes), dtype=np.int64, count=n)
+    pax = PAX_SERVICIO_HORA[servicio, hora]
+    for t, p in zip(trenes, pax.tolist()):
+        t['pax_estimados'] = p
+    return pax
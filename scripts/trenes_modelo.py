@@ -0,0 +1,114 @@
+"""
+=============================================================================
+TRENES MODELO - Trenes con clave (número + fecha de servicio)
+=============================================================================
+Descripción: El tablero de ADIF no trae fechas, repite filas y muestra
+             "programada\nestimada" en la celda de hora. Aquí cada fila se
+             convierte en un tren con clave (número, fecha de servicio), con
+             ambas horas y el retraso calculado, y cada ejecución se fusiona
+             sobre el estado anterior en vez de reemplazarlo.
+"""
+
+import re
+from datetime import datetime, timedelta
+
+from utils import ahora_local
+from config import LIMITS
+
+RE_NUMERO_TREN = re.compile(r"(\d+)\s*$")
+RE_HORA = re.compile(r"\d{2}:\d{2}")
+MARGEN_PASADO_MIN = 180  # Retraso máximo que se espera ver en el tablero
+
+# =============================================================================
+# PARSEO
+# =============================================================================
+def parsear_horas(celda):
+    """'12:00\\n12:10' -> ('12:00', '12:10'). Una sola hora: programada = estimada."""
+    horas = RE_HORA.findall(celda or "")
+    if not horas:
+        return None, None
+    return horas[0], horas[-1]
+
+def numero_tren(tren):
+    """'AVE 03302' -> '03302' (si no hay número, el nombre completo)."""
+    m = RE_NUMERO_TREN.search(tren)
+    return m.group(1) if m else tren
+
+def _minutos(hora):
+    h, m = hora.split(':')
+    return int(h) * 60 + int(m)
+
+def diferencia_minutos(desde, hasta):
+    """Minutos de `desde` a `hasta` (HH:MM), cruzando medianoche si hace falta."""
+    diff = _minutos(hasta) - _minutos(desde)
+    if diff < -720:
+        diff += 1440
+    elif diff > 720:
+        diff -= 1440
+    return diff
+
+def fecha_servicio(hora_programada, ahora):
+    """
+    El tablero es una ventana móvil sin fechas: desde poco antes de `ahora`
+    (trenes retrasados aún por llegar) hasta el resto del día y la madrugada
+    siguiente. Lo que cae hasta MARGEN_PASADO_MIN por detrás es pasado; el
+    resto, lo siguiente que va a ocurrir.
+    """
+    adelante = (_minutos(hora_programada) - (ahora.hour * 60 + ahora.minute)) % 1440
+    if adelante > 1440 - MARGEN_PASADO_MIN:
+        adelante -= 1440
+    return (ahora + timedelta(minutes=adelante)).date()
+
+def crear_tren(programada, estimada, otra_estacion, tren, via, ahora, campo_otro='origen'):
+    """
+    Registro publicado. `hora` sigue siendo la hora a mostrar (la estimada).
+    `campo_otro`: 'origen' en llegadas, 'destino' en salidas.
+    """
+    return {
+        "hora": estimada,
+        "hora_programada": programada,
+        "retraso_min": diferencia_minutos(programada, estimada),  # Negativo = adelantado
+        campo_otro: otra_estacion,
+        "tren": tren,
+        "via": via,
+        "fecha": fecha_servicio(programada, ahora).isoformat(),
+    }
+
+def clave_tren(t):
+    return (numero_tren(t['tren']), t['fecha'])
+
+# =============================================================================
+# FUSIÓN INCREMENTAL
+# =============================================================================
+def instante_tren(t):
+    """datetime de la hora estimada (fecha de servicio + retraso)."""
+    base = datetime.fromisoformat(f"{t['fecha']}T{t['hora_programada']}")
+    return base + timedelta(minutes=t.get('retraso_min', 0))
+
+def fusionar_trenes(previos, nuevos, ahora=None):
+    """
+    Una pasada con índice por clave: deduplica `nuevos`, los fusiona sobre
+    `previos` (lo fresco manda; la vía solo si viene informada) y descarta
+    los trenes llegados hace más de `train_retention_minutes`.
+    Devuelve la lista ordenada por fecha y hora.
+    """
+    ahora = ahora or ahora_local()
+    indice = {}
+    for t in previos:
+        # Registros antiguos (sin clave): se descartan, el tablero los volverá a traer
+        if 'fecha' in t and 'hora_programada' in t:
+            indice[clave_tren(t)] = t
+
+    for t in nuevos:
+        clave = clave_tren(t)
+        previo = indice.get(clave)
+        if previo is None:
+            indice[clave] = t
+            continue
+        via = t.get('via') or previo.get('via', '')
+        indice[clave] = {**previo, **t, 'via': via}
+
+    limite = ahora - timedelta(minutes=LIMITS.get('train_retention_minutes', 60))
+    vigentes = [t for t in indice.values() if instante_tren(t) >= limite]
+    vigentes.sort(key=lambda t: (t['fecha'], t['hora_programada'], t['tren']))
+    return vigentes
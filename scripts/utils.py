@@ -11,10 +11,15 @@ import json
 import os
 import shutil
 import logging
-from datetime import datetime
+from datetime import date, datetime
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 import time
 from typing import Any, Callable, Dict, List, Optional, Union
+from zoneinfo import ZoneInfo
+
+# Horas de AENA/ADIF: hora local de Barcelona (los runners de Actions van en UTC)
+ZONA_LOCAL = ZoneInfo('Europe/Madrid')
 
 # =============================================================================
 # LOGGING CONFIGURADO
@@ -277,6 +282,18 @@ class SafeWriter:
             return None
 
 
+# =============================================================================
+# HORA LOCAL
+# =============================================================================
+def ahora_local() -> datetime:
+    """Hora de pared en Barcelona, sin tzinfo (comparable con las horas de los feeds)."""
+    return datetime.now(ZONA_LOCAL).replace(tzinfo=None)
+
+def hoy_local() -> date:
+    """Fecha de hoy en Barcelona."""
+    return ahora_local().date()
+
+
 # =============================================================================
 # RETRY DECORATOR
 # =============================================================================
@@ -321,6 +338,55 @@ def retry_with_backoff(
     return decorator
 
 
+# =============================================================================
+# POOL DE FEEDS
+# =============================================================================
+def procesar_feeds(
+    feeds: List[Dict],
+    procesar: Callable[[Dict], Dict],
+    max_workers: int,
+    unidad: str,
+    logger: logging.Logger
+) -> Dict[str, Dict]:
+    """
+    Ejecuta `procesar(feed)` para cada feed en un pool de hilos y registra
+    una línea de resumen por feed. Un feed que revienta no tumba al resto:
+    cuenta como fallido.
+
+    Args:
+        feeds: Feeds con 'etiqueta'
+        procesar: Devuelve las métricas del feed ('ok', 'modo', 'duracion_s', `unidad`)
+        max_workers: Feeds a la vez
+        unidad: Métrica de volumen a resumir ('vuelos', 'trenes')
+        logger: Logger del scraper
+
+    Returns:
+        {etiqueta: métricas}, en el orden de `feeds`
+    """
+    def seguro(feed):
+        try:
+            return procesar(feed)
+        except Exception as e:
+            logger.error(f"❌ [{feed['etiqueta']}] Error inesperado: {e}")
+            return {'ok': False, 'modo': None, unidad: 0, 'duracion_s': None}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        resultados = dict(zip((f['etiqueta'] for f in feeds), pool.map(seguro, feeds)))
+
+    for etiqueta, m in resultados.items():
+        estado = "✅" if m['ok'] else "❌"
+        logger.info(f"{estado} {etiqueta}: {m[unidad]} {unidad} ({m['modo']}, {m['duracion_s']}s)")
+    return resultados
+
+
+def feeds_fallidos(resultados: Dict[str, Dict], principal: str) -> bool:
+    """True si el run debe fallar: cae el feed principal o caen todos."""
+    m = resultados.get(principal)
+    if m is not None and not m['ok']:
+        return True
+    return not any(m['ok'] for m in resultados.values())
+
+
 # =============================================================================
 # FUNCIONES DE CONVENIENCIA
 # =============================================================================
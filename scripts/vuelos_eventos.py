@@ -0,0 +1,156 @@
+"""
+=============================================================================
+EVENTOS DE VUELOS - Diff por clave entre snapshots de vuelos
+=============================================================================
+Descripción: Compara cada snapshot nuevo de un feed de vuelos con el anterior
+             (índices por clave, tiempo lineal) y publica en
+             <feed>_events.json un histórico corto de cambios tipados, para
+             que la app y las alertas lean kilobytes en vez del feed entero.
+Tipos:       nuevo | estado | hora | terminal (terminal o sala) | eliminado
+"""
+
+from datetime import date, datetime, timedelta
+
+from utils import safe_save_json, setup_logger, load_existing_or_default, ahora_local, hoy_local
+from config import LIMITS
+
+# --- LOGGER ---
+logger = setup_logger('Vuelos_Eventos')
+
+# =============================================================================
+# ÍNDICE POR CLAVE
+# =============================================================================
+def clave_evento(v, fecha_base):
+    """
+    (fecha real, código principal). La hora no entra en la clave para poder
+    detectar cambios de hora; sin código se usa el otro aeropuerto + hora.
+    """
+    fecha = (fecha_base + timedelta(days=v.get('dia_relativo', 0))).isoformat()
+    codigo = v.get('vuelo', 'N/A').split(' / ')[0].strip()
+    if codigo == 'N/A':
+        return (fecha, v.get('origen') or v.get('destino') or 'N/A', v.get('hora'))
+    return (fecha, codigo)
+
+def codigos_vuelo(v):
+    return [c.strip() for c in v.get('vuelo', 'N/A').split(' / ') if c.strip() != 'N/A']
+
+def indexar_vuelos(vuelos, fecha_base):
+    indice = {}
+    for v in vuelos:
+        base = clave = clave_evento(v, fecha_base)
+        # El mismo código dos veces el mismo día (raro): se numeran por orden
+        n = 1
+        while clave in indice:
+            clave = base + (n,)
+            n += 1
+        indice[clave] = v
+    return indice
+
+# =============================================================================
+# DIFF
+# =============================================================================
+def _evento(tipo, clave, v, antes=None, despues=None):
+    evento = {
+        'tipo': tipo,
+        'vuelo': v.get('vuelo', 'N/A'),
+        'fecha': clave[0],
+        'hora': v.get('hora'),
+        'terminal': v.get('terminal'),
+    }
+    if antes is not None or despues is not None:
+        evento['antes'] = antes
+        evento['despues'] = despues
+    return evento
+
+def detectar_cambios(previos, nuevos, fecha_previa, fecha_nueva, ahora=None):
+    """
+    Eventos entre dos snapshots. `fecha_previa` / `fecha_nueva` son las
+    fechas base de dia_relativo de cada uno. Los vuelos que desaparecen solo
+    cuentan como 'eliminado' si aún no había pasado su hora.
+    """
+    ahora = ahora or ahora_local()
+    indice_previo = indexar_vuelos(previos, fecha_previa)
+    # Cualquier código del codeshare vale para emparejar (el orden puede cambiar)
+    por_codigo = {}
+    for clave, v in indice_previo.items():
+        for codigo in codigos_vuelo(v):
+            por_codigo.setdefault((clave[0], codigo), clave)
+    eventos = []
+
+    for clave, v in indexar_vuelos(nuevos, fecha_nueva).items():
+        previo = indice_previo.pop(clave, None)
+        if previo is None:
+            for codigo in codigos_vuelo(v):
+                clave_previa = por_codigo.get((clave[0], codigo))
+                if clave_previa in indice_previo:
+                    previo = indice_previo.pop(clave_previa)
+                    break
+        if previo is None:
+            eventos.append(_evento('nuevo', clave, v, despues=v.get('estado')))
+            continue
+        if v.get('estado') != previo.get('estado'):
+            eventos.append(_evento('estado', clave, v, previo.get('estado'), v.get('estado')))
+        if v.get('hora') != previo.get('hora'):
+            eventos.append(_evento('hora', clave, v, previo.get('hora'), v.get('hora')))
+        if v.get('terminal') != previo.get('terminal') or v.get('sala') != previo.get('sala'):
+            eventos.append(_evento(
+                'terminal', clave, v,
+                f"{previo.get('terminal')} {previo.get('sala', '')}".strip(),
+                f"{v.get('terminal')} {v.get('sala', '')}".strip(),
+            ))
+
+    for clave, previo in indice_previo.items():
+        try:
+            programado = datetime.fromisoformat(f"{clave[0]}T{previo['hora']}")
+        except (KeyError, TypeError, ValueError):
+            continue
+        if programado >= ahora:
+            eventos.append(_evento('eliminado', clave, previo, previo.get('estado'), None))
+
+    return eventos
+
+# =============================================================================
+# PUBLICACIÓN (feed rodante)
+# =============================================================================
+def publicar_eventos(eventos, archivo):
+    """Añade los eventos al feed rodante (ids crecientes, poda por edad y tamaño)."""
+    if not eventos:
+        return True
+
+    feed = load_existing_or_default(archivo, default={}) or {}
+    ultimo_id = feed.get('ultimo_id', 0)
+    ahora = ahora_local()
+    ts = ahora.isoformat(timespec='seconds')
+    for evento in eventos:
+        ultimo_id += 1
+        evento['id'] = ultimo_id
+        evento['ts'] = ts
+
+    limite = (ahora - timedelta(hours=LIMITS.get('flight_events_max_age_hours', 24))).isoformat(timespec='seconds')
+    historico = [e for e in feed.get('eventos', []) if e.get('ts', '') >= limite] + eventos
+    historico = historico[-LIMITS.get('flight_events_max', 300):]
+
+    success, message = safe_save_json(
+        filepath=archivo,
+        data={'actualizado': ts, 'ultimo_id': ultimo_id, 'eventos': historico},
+        data_type='generic',
+        backup=False
+    )
+    if success:
+        logger.info(f"📣 {len(eventos)} eventos nuevos -> {archivo}")
+    else:
+        logger.error(message)
+    return success
+
+def registrar_cambios(previos, nuevos, fecha_previa, archivo, fecha_nueva=None):
+    """Diff + publicación. Sin snapshot previo no se emite nada (evita un alud de 'nuevo')."""
+    if not previos:
+        return []
+    try:
+        fecha_previa = date.fromisoformat(fecha_previa) if isinstance(fecha_previa, str) else fecha_previa
+    except ValueError:
+        fecha_previa = None
+    fecha_nueva = fecha_nueva or hoy_local()
+    eventos = detectar_cambios(previos, nuevos, fecha_previa or fecha_nueva, fecha_nueva)
+    publicar_eventos(eventos, archivo)
+    return eventos